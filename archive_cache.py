@@ -0,0 +1,147 @@
+"""
+Archive Cache for LMS Licker
+Finished zip archives on disk keyed by the file set and the version of each file,
+evicted least recently used first once the folder grows over a size limit
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from structured_log import get_logger
+
+log = get_logger('archive_cache')
+
+class ArchiveCache:
+    def __init__(self, folder='archive_cache', max_bytes=1024 * 1024 * 1024):
+        """
+        Initialize Archive Cache
+
+        Args:
+            folder: Folder holding one <key>.zip per archive (mtime = last use)
+            max_bytes: Total size kept, least recently used archives removed first
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def key(versions, options=''):
+        """
+        Args:
+            versions: {filename: version} of the archived files (None = file missing)
+            options: Settings that change the archive bytes (vd. mức nén)
+
+        Returns:
+            Cache key, the same whatever the order the files were selected in
+        """
+        data = json.dumps([sorted(versions.items()), options], ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.zip")
+
+    def get(self, key):
+        """
+        Returns:
+            Path of the cached archive (its last use is refreshed) or None
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def temp_path(self):
+        """Path to build a new archive at (same folder -> os.replace is atomic)"""
+        return os.path.join(self.folder, f".{os.getpid()}-{threading.get_ident()}-{time.time_ns()}.tmp")
+
+    def put(self, key, temp_path):
+        """
+        Move a finished archive into the cache
+
+        Returns:
+            Path of the cached archive
+        """
+        path = self._path(key)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def discard(self, temp_path):
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Remove every cached archive
+
+        Returns:
+            Number of archives removed
+        """
+        with self._lock:
+            removed = 0
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.name.endswith('.zip'):
+                        try:
+                            os.remove(entry.path)
+                            removed += 1
+                        except FileNotFoundError:
+                            pass
+            return removed
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used archives until the folder is under max_bytes
+
+        Args:
+            keep: Archive never removed (the one just added, about to be sent)
+
+        Returns:
+            Number of archives removed
+        """
+        with self._lock:
+            entries = []
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.name.endswith('.zip') and entry.path != keep:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            entries.sort()
+            total_size = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total_size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+            if removed:
+                log.info("🗑️ Archive cache evicted", count=removed, bytes=total_size)
+            return removed
+
+    def purge_temp(self, max_age=3600):
+        """Remove temp files left by builds that crashed"""
+        now = time.time()
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    try:
+                        if now - entry.stat().st_mtime > max_age:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
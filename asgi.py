@@ -0,0 +1,297 @@
+"""
+ASGI entry point for LMS Licker
+File downloads and admin zips stream from Google Drive on the event loop (aiohttp),
+every other route runs the Flask app in threads
+
+Usage:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import os
+import json
+import time
+import asyncio
+import mimetypes
+import unicodedata
+from datetime import datetime
+from urllib.parse import quote
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_cookie, parse_etags, quote_etag
+
+import metrics
+import fromminhmoi
+from async_drive_manager import AsyncGoogleDriveManager
+from structured_log import get_logger
+
+log = get_logger('asgi')
+
+# Số file Drive tải song song cho mỗi file zip
+ASYNC_ZIP_CONCURRENCY = int(os.environ.get('ASYNC_ZIP_CONCURRENCY', 8))
+# Kết nối HTTP tới Drive API dùng chung cho cả worker
+ASYNC_DRIVE_CONNECTIONS = int(os.environ.get('ASYNC_DRIVE_CONNECTIONS', 100))
+
+DOWNLOAD_PREFIX = '/download/data/'
+ZIP_PATH = '/admin/download-multiple'
+
+def _content_disposition(filename):
+    # Giống send_file: tên không phải ASCII -> thêm filename* (RFC 5987)
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def _invalid_filename(filename):
+    return not filename or '..' in filename or filename.startswith('/')
+
+class _ZipSink:
+    """Không seek được -> zipfile ghi data descriptor, các phần đã nén gửi ngay cho client"""
+
+    def __init__(self, copy=None):
+        self.parts = []
+        self.copy = copy  # File tạm của archive cache (tùy chọn)
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        if self.copy is not None:
+            self.copy.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+class LmsAsgiApp:
+    def __init__(self, flask_app):
+        """
+        Initialize LMS ASGI App
+
+        Args:
+            flask_app: Flask app serving every route not handled natively here
+        """
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self._drive = None
+
+    @property
+    def drive(self):
+        # drive_manager do fromminhmoi khởi tạo (None khi dùng storage local)
+        if self._drive is None and fromminhmoi.drive_manager is not None:
+            self._drive = AsyncGoogleDriveManager.from_manager(
+                fromminhmoi.drive_manager, max_connections=ASYNC_DRIVE_CONNECTIONS)
+        return self._drive
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and fromminhmoi.drive_manager is not None:
+            path, method = scope['path'], scope['method']
+            if path.startswith(DOWNLOAD_PREFIX) and method in ('GET', 'HEAD'):
+                if await self._download(scope, send, path[len(DOWNLOAD_PREFIX):]):
+                    return
+            elif path == ZIP_PATH and method == 'POST' and self._is_admin(scope):
+                return await self._download_zip(scope, receive, send)
+        # Còn lại (và mọi trường hợp đặc biệt: 400, file không có trong listing, chưa đăng nhập) -> Flask
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._drive is not None:
+                    await self._drive.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _is_admin(self, scope):
+        """Đọc session cookie đã ký của Flask (giống admin_required)"""
+        app = self.flask_app
+        headers = dict(scope['headers'])
+        cookie = parse_cookie(headers.get(b'cookie', b'').decode('latin-1')).get(app.session_cookie_name)
+        serializer = app.session_interface.get_signing_serializer(app)
+        if not cookie or serializer is None:
+            return False
+        try:
+            data = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return False
+        email = data.get('admin_email', '').lower()
+        return bool(data.get('admin_logged_in')) and email in [e.lower() for e in fromminhmoi.ADMIN_EMAILS]
+
+    def _record(self, endpoint, method, status, start, size=0):
+        metrics.http_latency.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+        metrics.http_requests.inc(endpoint=endpoint, method=method, status=status)
+        if size:
+            metrics.http_response_bytes.inc(size, endpoint=endpoint)
+
+    async def _download(self, scope, send, filename):
+        """
+        Stream one file from Drive, same headers as download_data_file
+
+        Returns:
+            False when the request should be handled by Flask instead
+        """
+        if _invalid_filename(filename):
+            return False
+        start = time.perf_counter()
+        entry = await asyncio.to_thread(fromminhmoi.get_storage_entry, filename)
+        if entry is None:
+            return False
+
+        method = scope['method']
+        etag = entry['etag']
+        headers = [(b'etag', quote_etag(etag).encode('latin-1')), (b'cache-control', b'public, no-cache')]
+        if_none_match = dict(scope['headers']).get(b'if-none-match')
+        if if_none_match and parse_etags(if_none_match.decode('latin-1')).contains(etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            self._record('download_data_file', method, 304, start)
+            return True
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        headers += [
+            (b'content-type', mimetype.encode('latin-1')),
+            (b'content-disposition', _content_disposition(filename).encode('latin-1')),
+        ]
+        if method == 'HEAD':
+            headers.append((b'content-length', str(entry['size']).encode('latin-1')))
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            self._record('download_data_file', method, 200, start)
+            return True
+
+        response = await self.drive.open_download(entry['id'])
+        if response is None:
+            body = b'File not found on Drive'
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': body})
+            self._record('download_data_file', method, 404, start)
+            return True
+
+        # aiohttp tự giải nén gzip/deflate -> Content-Length của Drive khi đó không khớp body gửi đi
+        if response.content_length is not None and not response.headers.get('Content-Encoding'):
+            headers.append((b'content-length', str(response.content_length).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        size = 0
+        try:
+            async for chunk in self.drive.iter_download(response):
+                size += len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        except Exception:
+            # Header đã gửi: chỉ có thể ngắt kết nối để client biết file bị cắt
+            log.exception("❌ Streamed download interrupted", file=filename, bytes=size)
+            self._record('download_data_file', method, 500, start, size)
+            raise
+        await send({'type': 'http.response.body', 'body': b''})
+        self._record('download_data_file', method, 200, start, size)
+        return True
+
+    async def _read_body(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    async def _send_json(self, send, status, data):
+        body = json.dumps(data).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _fetch(self, filename, semaphore):
+        async with semaphore:
+            entry = await asyncio.to_thread(fromminhmoi.get_storage_entry, filename)
+            file_id = entry['id'] if entry else await self.drive.get_file_id_by_name(filename)
+            if not file_id:
+                return None
+            return await self.drive.download_file_to_memory(file_id)
+
+    async def _download_zip(self, scope, receive, send):
+        """
+        Same zip as admin_download_multiple: files downloaded concurrently, zip streamed as it is built
+        and saved to the archive cache; archives already cached are sent from disk by Flask
+        """
+        start = time.perf_counter()
+        body = await self._read_body(receive)
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            data = None
+        filenames = data.get('files', []) if isinstance(data, dict) else []
+        if not filenames:
+            await self._send_json(send, 400, {'error': 'No files specified'})
+            self._record('admin_download_multiple', 'POST', 400, start)
+            return
+
+        key, versions = await asyncio.to_thread(fromminhmoi.zip_cache_key, filenames)
+        # Mọi thao tác file (cache, file tạm) chạy ở thread: không chặn event loop
+        if await asyncio.to_thread(fromminhmoi.archive_cache.get, key):
+            async def replay():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await self.wsgi(scope, replay, send)
+        metrics.record_cache('archive', False)
+        # Thứ tự theo tên như build_cached_zip -> cùng một file zip dù chọn theo thứ tự nào
+        filenames = sorted(versions)
+
+        semaphore = asyncio.Semaphore(ASYNC_ZIP_CONCURRENCY)
+        tasks = [asyncio.ensure_future(self._fetch(filename, semaphore)) for filename in filenames]
+        download_name = f'files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'application/zip'),
+            (b'content-disposition', _content_disposition(download_name).encode('latin-1')),
+        ]})
+
+        temp_path = fromminhmoi.archive_cache.temp_path()
+        copy = await asyncio.to_thread(open, temp_path, 'wb')
+        sink = _ZipSink(copy)
+        size = 0
+        complete = True
+        try:
+            zf = fromminhmoi.open_zip_writer(sink)
+            # Ghi lần lượt, các file sau vẫn tải trong lúc file trước đang nén
+            for filename, task in zip(filenames, tasks):
+                try:
+                    content = await task
+                except Exception as e:
+                    log.error("Error adding file to zip", file=filename, error=e)
+                    complete = False
+                    continue
+                if content is None and versions[filename] is not None:
+                    complete = False
+                if content:
+                    await asyncio.to_thread(zf.add, filename, content)
+                    chunk = sink.take()
+                    size += len(chunk)
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await asyncio.to_thread(zf.close)
+            await asyncio.to_thread(copy.close)
+            if complete:
+                await asyncio.to_thread(fromminhmoi.archive_cache.put, key, temp_path)
+            chunk = sink.take()
+            size += len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk})
+        except Exception:
+            log.exception("❌ Streamed zip interrupted", files=len(filenames), bytes=size)
+            self._record('admin_download_multiple', 'POST', 500, start, size)
+            raise
+        finally:
+            # Client ngắt kết nối -> bỏ các lượt tải còn lại và file zip dở
+            for task in tasks:
+                task.cancel()
+            await asyncio.to_thread(copy.close)
+            await asyncio.to_thread(fromminhmoi.archive_cache.discard, temp_path)
+        self._record('admin_download_multiple', 'POST', 200, start, size)
+
+application = LmsAsgiApp(fromminhmoi.app)
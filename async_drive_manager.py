@@ -0,0 +1,161 @@
+"""
+Async Google Drive Manager for LMS Licker
+aiohttp client for the Drive v3 REST API (list, download, streamed download) sharing the
+credentials of GoogleDriveManager, so one event loop can run hundreds of transfers at once
+"""
+
+import asyncio
+
+import aiohttp
+from google.auth.transport.requests import Request
+
+from metrics import drive_call, record_drive_error, record_drive_bytes
+from structured_log import get_logger
+
+log = get_logger('drive_async')
+
+DRIVE_API = 'https://www.googleapis.com/drive/v3'
+CHUNK_SIZE = 256 * 1024
+
+class AsyncGoogleDriveManager:
+    def __init__(self, credentials, folder_id=None, max_connections=100, timeout=300):
+        """
+        Initialize Async Google Drive Manager
+
+        Args:
+            credentials: google.auth credentials (OAuth or service account) already scoped for Drive
+            folder_id: Google Drive folder ID holding the files (optional)
+            max_connections: Concurrent HTTP connections to the Drive API
+            timeout: Total seconds allowed for one API call / transfer
+        """
+        self.credentials = credentials
+        self.folder_id = folder_id
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._session = None
+        self._refresh_lock = None
+
+    @classmethod
+    def from_manager(cls, manager, **kwargs):
+        """Reuse the credentials of a GoogleDriveManager (token.json or credentials.json)"""
+        # googleapiclient + google-auth: service._http là AuthorizedHttp giữ credentials
+        return cls(manager.service._http.credentials, manager.folder_id, **kwargs)
+
+    async def _get_session(self):
+        # ClientSession phải tạo trong event loop đang chạy
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                raise_for_status=True
+            )
+            self._refresh_lock = asyncio.Lock()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _headers(self):
+        await self._get_session()
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    # Refresh token dùng requests (blocking) -> chạy ở thread
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        return {'Authorization': f'Bearer {self.credentials.token}'}
+
+    async def _get_json(self, path, params):
+        session = await self._get_session()
+        async with session.get(f'{DRIVE_API}{path}', params=params, headers=await self._headers()) as response:
+            return await response.json()
+
+    @drive_call
+    async def list_files(self):
+        """
+        List all files in the Drive folder
+
+        Returns:
+            List of file dictionaries with name, id, size, modifiedTime, md5Checksum, properties
+        """
+        query = f"'{self.folder_id}' in parents and trashed=false" if self.folder_id else "trashed=false"
+        try:
+            result = await self._get_json('/files', {
+                'q': query,
+                'pageSize': '1000',
+                'fields': 'files(id, name, size, modifiedTime, mimeType, md5Checksum, properties)'
+            })
+            return result.get('files', [])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            record_drive_error(error)
+            log.error("❌ List error", error=error)
+            return []
+
+    @drive_call
+    async def get_file_id_by_name(self, filename):
+        """
+        Get file ID by filename
+
+        Returns:
+            File ID or None if not found
+        """
+        query = f"name='{filename}' and trashed=false"
+        if self.folder_id:
+            query += f" and '{self.folder_id}' in parents"
+        try:
+            result = await self._get_json('/files', {'q': query, 'pageSize': '1', 'fields': 'files(id, name)'})
+            files = result.get('files', [])
+            return files[0]['id'] if files else None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            record_drive_error(error)
+            log.error("❌ Search error", file=filename, error=error)
+            return None
+
+    @drive_call
+    async def download_file_to_memory(self, file_id):
+        """
+        Download a file to memory
+
+        Returns:
+            File content as bytes, or None on failure
+        """
+        try:
+            session = await self._get_session()
+            async with session.get(f'{DRIVE_API}/files/{file_id}', params={'alt': 'media'},
+                                   headers=await self._headers()) as response:
+                content = await response.read()
+            record_drive_bytes('download', len(content))
+            return content
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            record_drive_error(error)
+            log.error("❌ Download to memory error", id=file_id, error=error)
+            return None
+
+    @drive_call
+    async def open_download(self, file_id):
+        """
+        Start a streamed download: headers are checked before the caller commits to a response
+
+        Returns:
+            aiohttp response (read it with iter_download, then release it) or None on failure
+        """
+        try:
+            session = await self._get_session()
+            return await session.get(f'{DRIVE_API}/files/{file_id}', params={'alt': 'media'},
+                                     headers=await self._headers())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            record_drive_error(error)
+            log.error("❌ Download error", id=file_id, error=error)
+            return None
+
+    async def iter_download(self, response, chunk_size=CHUNK_SIZE):
+        """Yield the body of a response from open_download chunk by chunk, then release it"""
+        size = 0
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                size += len(chunk)
+                yield chunk
+        finally:
+            response.release()
+            record_drive_bytes('download', size, method='iter_download')
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for LMS Licker (no Google credentials needed)
+
+Usage:
+    python -m benchmarks.run
+"""
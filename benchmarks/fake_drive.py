@@ -0,0 +1,239 @@
+"""
+Fake Google Drive for LMS Licker benchmarks
+In-process stand-in for the googleapiclient Drive v3 surface used by GoogleDriveManager
+(files.list / get_media / create / update / delete) with injectable latency and errors
+"""
+
+import re
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.client import responses
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from google_drive_manager import GoogleDriveManager
+
+NAME_QUERY = re.compile(r"name='((?:[^'\\]|\\.)*)'")
+PARENT_QUERY = re.compile(r"'([^']+)' in parents")
+MEDIA_URI = 'https://www.googleapis.com/drive/v3/files/{}?alt=media'
+
+def _response(status, **headers):
+    response = httplib2.Response(dict(headers, status=str(status)))
+    response.reason = responses.get(status, '')
+    return response
+
+def _error(status, uri=''):
+    return HttpError(_response(status), f'{{"error": {{"code": {status}}}}}'.encode('utf-8'), uri=uri)
+
+class FakeRequest:
+    """Like googleapiclient.http.HttpRequest: nothing happens until execute()"""
+
+    def __init__(self, service, method, action):
+        self.service = service
+        self.method = method
+        self.action = action
+
+    def execute(self, num_retries=0):
+        self.service._before_call(self.method)
+        return self.action()
+
+class FakeMediaHttp:
+    """httplib2.Http stand-in answering the Range requests of MediaIoBaseDownload"""
+
+    def __init__(self, service, file_id):
+        self.service = service
+        self.file_id = file_id
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        try:
+            self.service._before_call('get_media')
+        except HttpError as e:
+            return e.resp, e.content
+
+        content = self.service._content(self.file_id)
+        if content is None:
+            return _response(404), b'{"error": {"code": 404}}'
+        if not content:
+            return _response(416, **{'content-range': 'bytes */0'}), b''
+
+        match = re.match(r'bytes=(\d+)-(\d*)', (headers or {}).get('range', ''))
+        start = int(match.group(1)) if match else 0
+        end = min(int(match.group(2)) if match and match.group(2) else len(content) - 1, len(content) - 1)
+        chunk = content[start:end + 1]
+        return _response(206, **{'content-range': f'bytes {start}-{end}/{len(content)}'}), chunk
+
+class FakeMediaRequest:
+    """What files().get_media() returns: consumed by MediaIoBaseDownload"""
+
+    def __init__(self, service, file_id):
+        self.uri = MEDIA_URI.format(file_id)
+        self.headers = {}
+        self.http = FakeMediaHttp(service, file_id)
+
+class FakeFilesResource:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, q='', pageSize=100, fields=None, **kwargs):
+        return FakeRequest(self.service, 'list', lambda: {'files': self.service._query(q, pageSize)})
+
+    def get_media(self, fileId, **kwargs):
+        return FakeMediaRequest(self.service, fileId)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def action():
+            content = media_body.getbytes(0, media_body.size()) if media_body is not None else b''
+            return self.service._public(self.service.add_file(
+                body['name'], content, parents=body.get('parents'), properties=body.get('properties')
+            ))
+        return FakeRequest(self.service, 'create', action)
+
+    def update(self, fileId, body=None, **kwargs):
+        return FakeRequest(self.service, 'update', lambda: self.service._update(fileId, body or {}))
+
+    def delete(self, fileId, **kwargs):
+        return FakeRequest(self.service, 'delete', lambda: self.service._delete(fileId))
+
+class FakeDriveService:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        """
+        Initialize Fake Drive Service
+
+        Args:
+            latency: Seconds added to every API call (number, or dict method -> seconds with optional 'default')
+            jitter: Up to this many extra seconds per call, drawn from the seeded RNG
+            error_rate: Probability of an HTTP 500 per call (number or dict like latency)
+            seed: Seed for jitter / error draws so runs are repeatable
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files = {}      # id -> file record (content included)
+        self._failures = []   # [method or None, status, remaining]
+        self._next_id = 1
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def files(self):
+        return FakeFilesResource(self)
+
+    @staticmethod
+    def _setting(value, method):
+        if isinstance(value, dict):
+            return value.get(method, value.get('default', 0))
+        return value
+
+    def fail_next(self, method=None, status=500, count=1):
+        """Make the next `count` calls of `method` (any method if None) fail with HTTP `status`"""
+        with self._lock:
+            self._failures.append([method, status, count])
+
+    def _before_call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            status = None
+            for failure in self._failures:
+                if failure[0] in (None, method) and failure[2] > 0:
+                    failure[2] -= 1
+                    status = failure[1]
+                    break
+            if status is None and self._random.random() < self._setting(self.error_rate, method):
+                status = 500
+            delay = self._setting(self.latency, method)
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            with self._lock:
+                self.errors[method] += 1
+            raise _error(status)
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+
+    def add_file(self, name, content, parents=None, properties=None):
+        """
+        Store a file directly (no latency / errors)
+
+        Returns:
+            Record of the new file
+        """
+        with self._lock:
+            file_id = f"fake{self._next_id:08d}"
+            self._next_id += 1
+            record = {
+                'id': file_id,
+                'name': name,
+                'mimeType': 'application/octet-stream',
+                'parents': list(parents or []),
+                'properties': dict(properties or {}),
+                'trashed': False,
+                'content': bytes(content),
+            }
+            self._touch(record)
+            self._files[file_id] = record
+            return record
+
+    @staticmethod
+    def _touch(record):
+        record['size'] = str(len(record['content']))
+        record['md5Checksum'] = hashlib.md5(record['content']).hexdigest()
+        record['modifiedTime'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')[:-4] + 'Z'
+        record.setdefault('createdTime', record['modifiedTime'])
+
+    @staticmethod
+    def _public(record):
+        return {k: v for k, v in record.items() if k not in ('content', 'trashed', 'parents')}
+
+    def _content(self, file_id):
+        record = self._files.get(file_id)
+        return record['content'] if record and not record['trashed'] else None
+
+    def _query(self, q, page_size):
+        """Only the query shapes GoogleDriveManager builds: name='x', '<folder>' in parents, trashed=false"""
+        name = NAME_QUERY.search(q)
+        parent = PARENT_QUERY.search(q)
+        with self._lock:
+            files = [
+                self._public(record) for record in self._files.values()
+                if not record['trashed']
+                and (name is None or record['name'] == name.group(1))
+                and (parent is None or parent.group(1) in record['parents'])
+            ]
+        return files[:page_size]
+
+    def _update(self, file_id, body):
+        with self._lock:
+            record = self._files.get(file_id)
+            if record is None:
+                raise _error(404)
+            if 'properties' in body:
+                record['properties'].update(body['properties'])
+            if 'name' in body:
+                record['name'] = body['name']
+            return self._public(record)
+
+    def _delete(self, file_id):
+        with self._lock:
+            if self._files.pop(file_id, None) is None:
+                raise _error(404)
+        return ''
+
+def make_drive_manager(service, folder_id='fake-folder', num_retries=0):
+    """GoogleDriveManager talking to a FakeDriveService (skips authentication)"""
+    manager = GoogleDriveManager.__new__(GoogleDriveManager)
+    manager.credentials_file = None
+    manager.folder_id = folder_id
+    manager.num_retries = num_retries
+    manager.service = service
+    return manager
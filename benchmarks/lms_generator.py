@@ -0,0 +1,130 @@
+"""
+Synthetic LMS exports for LMS Licker benchmarks
+Seeded generators covering every question type handled by process_question
+"""
+
+import json
+import random
+
+QUESTION_TYPES = ('radio', 'checkbox', 'group-radio', 'drag_drop', 'group-input', 'unknown')
+
+WORDS = (
+    'hệ', 'thống', 'dữ', 'liệu', 'mạng', 'máy', 'tính', 'thuật', 'toán', 'cấu', 'trúc',
+    'phân', 'tích', 'quản', 'lý', 'kinh', 'tế', 'lịch', 'sử', 'triết', 'học', 'pháp', 'luật',
+    'network', 'database', 'process', 'memory', 'thread', 'query', 'index', 'model',
+)
+MARKUP = ('<p>{}</p>', '<span style="color: #333">{}</span>', '<strong>{}</strong>', '{}&nbsp;', '<em>{}</em> &amp; {}')
+IMAGE = '<img src="https://lms.example.edu/upload/{}.png" alt="" width="320">'
+
+class LmsExportGenerator:
+    def __init__(self, seed=0, image_ratio=0.1, words=(8, 40)):
+        """
+        Initialize LMS Export Generator
+
+        Args:
+            seed: Random seed - same seed, same export
+            image_ratio: Share of questions whose direction contains an <img>
+            words: (min, max) number of words in a question direction
+        """
+        self.random = random.Random(seed)
+        self.image_ratio = image_ratio
+        self.words = words
+        self._next_id = 100000
+
+    def _id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _text(self, low, high):
+        words = [self.random.choice(WORDS) for _ in range(self.random.randint(low, high))]
+        parts = []
+        for start in range(0, len(words), 6):
+            chunk = ' '.join(words[start:start + 6])
+            template = self.random.choice(MARKUP)
+            parts.append(template.format(chunk, chunk) if template.count('{}') == 2 else template.format(chunk))
+        return ' '.join(parts)
+
+    def _direction(self, blank=False):
+        text = self._text(*self.words)
+        if blank:
+            text += ' ________ ' + self._text(2, 6)
+        if self.random.random() < self.image_ratio:
+            text += IMAGE.format(self.random.getrandbits(32))
+        return text
+
+    def _options(self, count):
+        return [{'id': self._id(), 'value': self._text(1, 8)} for _ in range(count)]
+
+    def _question(self, question_type, direction, group_id=0, options=None):
+        return {
+            'id': self._id(),
+            'question_type': question_type,
+            'question_direction': direction,
+            'group_id': group_id,
+            'answer_option': options or [],
+        }
+
+    def choice(self, question_type='radio'):
+        """radio / checkbox question"""
+        return [self._question(question_type, self._direction(), options=self._options(self.random.randint(3, 5)))]
+
+    def true_false(self, children=4):
+        """group-radio parent followed by its Đúng/Sai children"""
+        parent = self._question('group-radio', self._direction())
+        return [parent] + [
+            self._question('group-radio', self._text(6, 20), parent['id'],
+                           [{'id': self._id(), 'value': 'Đúng'}, {'id': self._id(), 'value': 'Sai'}])
+            for _ in range(children)
+        ]
+
+    def drag_drop(self, children=4):
+        """drag_drop parent holding the options, followed by the items to match"""
+        parent = self._question('drag_drop', self._direction(), options=self._options(children))
+        return [parent] + [self._question('drag_drop', self._text(3, 12), parent['id']) for _ in range(children)]
+
+    def fill_in(self, children=2):
+        """group-input parent with blanks, followed by one child per answer"""
+        parent = self._question('group-input', self._direction(blank=True))
+        return [parent] + [self._question('group-input', self._text(1, 3), parent['id']) for _ in range(children)]
+
+    def unknown(self):
+        """Question type process_question does not know"""
+        return [self._question(self.random.choice(('essay', 'matrix', 'ordering')), self._direction())]
+
+    def questions(self, count, types=QUESTION_TYPES):
+        """
+        Generate about `count` questions (children included), cycling through `types`
+
+        Returns:
+            List of question dicts as found in an LMS export
+        """
+        builders = {
+            'radio': lambda: self.choice('radio'),
+            'checkbox': lambda: self.choice('checkbox'),
+            'group-radio': lambda: self.true_false(self.random.randint(2, 4)),
+            'drag_drop': lambda: self.drag_drop(self.random.randint(3, 5)),
+            'group-input': lambda: self.fill_in(self.random.randint(1, 3)),
+            'unknown': self.unknown,
+        }
+        questions = []
+        turn = 0
+        while len(questions) < count:
+            questions.extend(builders[types[turn % len(types)]]())
+            turn += 1
+        return questions
+
+    def export(self, count, types=QUESTION_TYPES, legacy=False):
+        """
+        Generate an export as JSON text
+
+        Args:
+            count: Approximate number of questions
+            types: Question types to include
+            legacy: Old {'data': [{'test': [...]}]} structure instead of {'test': [...]}
+
+        Returns:
+            JSON string (what users paste / upload)
+        """
+        questions = self.questions(count, types)
+        data = {'data': [{'test': questions}]} if legacy else {'test': questions}
+        return json.dumps(data, ensure_ascii=False)
@@ -0,0 +1,275 @@
+"""
+Benchmark runner for LMS Licker
+Time parse_questions, clean_html, Drive listing, the zip routes and uploads against
+synthetic exports and a fake Drive, report throughput / latency / peak memory per scenario
+
+Usage:
+    python -m benchmarks.run                                   # all scenarios
+    python -m benchmarks.run parse_questions zip_admin_drive   # some scenarios
+    python -m benchmarks.run --latency 50 --error-rate 0.01 --json bench.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from benchmarks.fake_drive import FakeDriveService, make_drive_manager
+from benchmarks.lms_generator import LmsExportGenerator
+
+ADMIN_EMAIL = 'bench@example.com'
+
+def load_app(workdir):
+    """
+    Import the Flask app with local storage, running inside workdir
+    (metadata.db, caches... are created there instead of in the repository)
+    """
+    os.environ.update({
+        'USE_GOOGLE_DRIVE': 'false',
+        'STATIC_AUTO_BUILD': 'false',
+        'ADMIN_EMAILS': ADMIN_EMAIL,
+        'SUPER_ADMIN_EMAIL': ADMIN_EMAIL,
+        'SECRET_KEY': 'benchmark',
+    })
+    # Log của app / GoogleDriveManager: chỉ lỗi (đặt LOG_LEVEL để xem thêm)
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.chdir(workdir)
+    import fromminhmoi
+    return fromminhmoi
+
+class Benchmarks:
+    def __init__(self, app_module, seed=0, latency=0.02, error_rate=0.0):
+        """
+        Initialize Benchmarks
+
+        Args:
+            app_module: Imported fromminhmoi module
+            seed: Seed of the export generators and the fake Drive
+            latency: Simulated Drive round trip in seconds
+            error_rate: Probability of an HTTP 500 per Drive call
+        """
+        self.app = app_module
+        self.seed = seed
+        self.latency = latency
+        self.error_rate = error_rate
+        self.service = None
+        self.scenarios = {
+            'parse_questions': self.parse_questions,
+            'clean_html': self.clean_html,
+            'list_files': self.list_files,
+            'list_storage_entries': self.list_storage_entries,
+            'zip_data_local': self.zip_data_local,
+            'zip_data_local_cached': lambda: self.zip_data_local(cached=True),
+            'zip_admin_drive': self.zip_admin_drive,
+            'zip_admin_drive_cached': lambda: self.zip_admin_drive(cached=True),
+            'upload_drive': self.upload_drive,
+        }
+
+    def _fake_drive(self, files=0, size=8 * 1024):
+        """Fresh fake Drive (with `files` synthetic exports of about `size` bytes) wired into the app"""
+        self.service = FakeDriveService(latency=self.latency, error_rate=self.error_rate, seed=self.seed)
+        manager = make_drive_manager(self.service)
+        generator = LmsExportGenerator(self.seed)
+        for number in range(files):
+            content = generator.export(max(1, size // 600)).encode('utf-8')
+            self.service.add_file(f"export_{number:04d}.json", content, parents=[manager.folder_id],
+                                  properties={'uploader': 'bench'})
+        self.app.drive_manager = manager
+        self.app.invalidate_listing()
+        return manager
+
+    def _local_storage(self):
+        self.service = None
+        self.app.drive_manager = None
+        self.app.invalidate_listing()
+
+    def _admin_client(self):
+        client = self.app.app.test_client()
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+            session['admin_email'] = ADMIN_EMAIL
+            session['admin_name'] = 'Bench'
+        return client
+
+    # Scenarios: setup, then return (operation, items per operation)
+
+    def parse_questions(self):
+        json_code = LmsExportGenerator(self.seed).export(1000)
+        count = len(json.loads(json_code)['test'])
+        return lambda: self.app.parse_questions(json_codes=[json_code]), count
+
+    def clean_html(self):
+        directions = [q['question_direction'] for q in LmsExportGenerator(self.seed, image_ratio=0.3).questions(1000)]
+        clean_html = self.app.clean_html
+        return lambda: [clean_html(direction) for direction in directions], len(directions)
+
+    def list_files(self):
+        manager = self._fake_drive(files=300, size=512)
+        return manager.list_files, 300
+
+    def list_storage_entries(self):
+        self._fake_drive(files=300, size=512)
+
+        def operation():
+            self.app.invalidate_listing()
+            return self.app.list_storage_entries()
+        return operation, 300
+
+    def _zip_operation(self, client, url, names, cached):
+        """
+        POST the same file set each time: cached=False empties archive_cache first so every
+        run downloads and compresses, cached=True times the archive_cache hit
+        """
+        def operation():
+            if not cached:
+                self.app.archive_cache.clear()
+            response = client.post(url, json={'files': names})
+            assert response.status_code == 200, response.status_code
+            return response.get_data()
+        if cached:
+            operation()  # archive trong cache ngay cả khi --warmup 0
+        return operation
+
+    def zip_data_local(self, cached=False):
+        self._local_storage()
+        os.makedirs(self.app.DATA_FOLDER, exist_ok=True)
+        generator = LmsExportGenerator(self.seed)
+        names = []
+        for number in range(10):
+            name = f"local_export_{number:02d}.json"
+            with open(os.path.join(self.app.DATA_FOLDER, name), 'w', encoding='utf-8') as f:
+                f.write(generator.export(300))
+            names.append(name)
+        client = self.app.app.test_client()
+        return self._zip_operation(client, '/download/data-multiple', names, cached), len(names)
+
+    def zip_admin_drive(self, cached=False):
+        self._fake_drive(files=10, size=200 * 1024)
+        names = [f"export_{number:04d}.json" for number in range(10)]
+        client = self._admin_client()
+        return self._zip_operation(client, '/admin/download-multiple', names, cached), len(names)
+
+    def upload_drive(self):
+        self._fake_drive()
+        generator = LmsExportGenerator(self.seed)
+        payloads = [generator.export(200).encode('utf-8') for _ in range(5)]
+        client = self._admin_client()
+        counter = iter(range(sys.maxsize))
+
+        def operation():
+            run = next(counter)
+            files = [(io.BytesIO(payload), f"upload_{run:04d}_{number}.json") for number, payload in enumerate(payloads)]
+            response = client.post('/admin/upload', data={'files': files}, content_type='multipart/form-data')
+            assert response.status_code == 200, response.status_code
+            return response.get_json()
+        return operation, len(payloads)
+
+    def run(self, name, iterations=20, warmup=2):
+        """
+        Run one scenario
+
+        Returns:
+            Dict of results (latencies in milliseconds, peak memory in KiB)
+        """
+        operation, items = self.scenarios[name]()
+        for _ in range(warmup):
+            operation()
+        if self.service is not None:
+            self.service.reset_stats()
+
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            samples.append(time.perf_counter() - start)
+
+        # Đo bộ nhớ ở một lần chạy riêng (tracemalloc làm chậm đáng kể)
+        tracemalloc.start()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        samples.sort()
+        total = sum(samples)
+        result = {
+            'scenario': name,
+            'iterations': iterations,
+            'items_per_op': items,
+            'ops_per_sec': round(iterations / total, 2),
+            'items_per_sec': round(iterations * items / total, 1),
+            'mean_ms': round(total / iterations * 1000, 3),
+            'p50_ms': round(_percentile(samples, 0.5) * 1000, 3),
+            'p95_ms': round(_percentile(samples, 0.95) * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3),
+            'peak_kib': round(peak / 1024, 1),
+        }
+        if self.service is not None:
+            result['drive_calls_per_op'] = {
+                method: round(count / (iterations + 1), 2) for method, count in sorted(self.service.calls.items())
+            }
+            result['drive_errors'] = dict(self.service.errors)
+        return result
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of sorted samples"""
+    return samples[min(len(samples) - 1, max(0, round(fraction * len(samples) + 0.5) - 1))]
+
+def print_table(results):
+    columns = ('scenario', 'items_per_op', 'ops_per_sec', 'items_per_sec', 'p50_ms', 'p95_ms', 'max_ms', 'peak_kib')
+    widths = [max(len(column), *(len(str(r[column])) for r in results)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print('  '.join(str(result[column]).ljust(width) for column, width in zip(columns, widths)))
+        if result.get('drive_calls_per_op'):
+            calls = ', '.join(f"{method}={count}" for method, count in result['drive_calls_per_op'].items())
+            print(f"    drive calls/op: {calls}" + (f"  errors: {result['drive_errors']}" if result['drive_errors'] else ''))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline LMS Licker benchmarks (fake Google Drive)')
+    parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=20, help='Simulated Drive latency per call, in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an HTTP 500 per Drive call')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='lms-bench-') as workdir:
+        benchmarks = Benchmarks(load_app(workdir), seed=args.seed, latency=args.latency / 1000, error_rate=args.error_rate)
+        unknown = [name for name in args.scenarios if name not in benchmarks.scenarios]
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(unknown)} (choose from {', '.join(benchmarks.scenarios)})")
+
+        results = []
+        for name in args.scenarios or benchmarks.scenarios:
+            print(f"⏱️ {name}...", file=sys.stderr)
+            results.append(benchmarks.run(name, iterations=args.iterations, warmup=args.warmup))
+        # Chờ index nền (upload) xong trước khi xóa thư mục tạm
+        benchmarks.app.library_executor.shutdown(wait=True)
+        os.chdir(cwd)
+
+    print_table(results)
+    if json_path:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {
+                'iterations': args.iterations, 'seed': args.seed,
+                'latency_ms': args.latency, 'error_rate': args.error_rate,
+            },
+            'results': results,
+        }
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results written to {json_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+DOCX Preview for LMS Licker
+Convert a .docx into sanitized HTML blocks (paragraphs, tables, images) for the admin preview
+"""
+
+import io
+import html
+import base64
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+V = '{urn:schemas-microsoft-com:vml}'
+M = '{http://schemas.openxmlformats.org/officeDocument/2006/math}'
+PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+HEADING_STYLES = {
+    'title': 'h1', 'subtitle': 'h2',
+    'heading1': 'h1', 'heading2': 'h2', 'heading3': 'h3',
+    'heading4': 'h4', 'heading5': 'h5', 'heading6': 'h6',
+}
+ALIGNMENTS = {'center': 'center', 'right': 'right', 'end': 'right', 'both': 'justify', 'distribute': 'justify'}
+# Chỉ nhúng ảnh raster (SVG có thể chứa script)
+IMAGE_TYPES = {
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif', '.bmp': 'image/bmp', '.webp': 'image/webp',
+}
+SAFE_LINK_PREFIXES = ('http://', 'https://', 'mailto:')
+INLINE_CONTAINERS = (W + 'ins', W + 'smartTag', W + 'fldSimple', W + 'customXml')
+IMAGE_PLACEHOLDER = '<span class="docx-image">[hình ảnh]</span>'
+
+def _on(props, name):
+    """Word toggle property (<w:b/>, <w:b w:val="0"/>, ...)"""
+    if props is None:
+        return False
+    element = props.find(W + name)
+    return element is not None and element.get(W + 'val', 'true') not in ('0', 'false', 'off', 'none')
+
+class DocxConverter:
+    def __init__(self, content, max_image_bytes=1024 * 1024):
+        """
+        Initialize DOCX Converter
+
+        Args:
+            content: .docx file content as bytes
+            max_image_bytes: Larger images are replaced by a placeholder instead of a data URI
+        """
+        self.zip = zipfile.ZipFile(io.BytesIO(content))
+        self.max_image_bytes = max_image_bytes
+        self.images = 0
+        self.rels = self._load_rels()
+        self.list_styles = self._load_list_styles()
+
+    def _load_rels(self):
+        try:
+            root = ET.fromstring(self.zip.read('word/_rels/document.xml.rels'))
+        except KeyError:
+            return {}
+        return {
+            rel.get('Id'): (rel.get('Target', ''), rel.get('TargetMode'))
+            for rel in root.iter(PKG_REL + 'Relationship')
+        }
+
+    def _load_list_styles(self):
+        """Paragraph styles that are numbered / bulleted by definition (List Bullet, ...)"""
+        try:
+            root = ET.fromstring(self.zip.read('word/styles.xml'))
+        except KeyError:
+            return set()
+        return {
+            style.get(W + 'styleId')
+            for style in root.iter(W + 'style')
+            if style.find(f'{W}pPr/{W}numPr') is not None
+        }
+
+    def convert(self):
+        """
+        Returns:
+            List of HTML strings, one per top-level block (paragraph or table)
+        """
+        root = ET.fromstring(self.zip.read('word/document.xml'))
+        body = root.find(W + 'body')
+        return list(self._blocks(body)) if body is not None else []
+
+    def _blocks(self, parent):
+        for child in parent:
+            if child.tag == W + 'p':
+                yield self._paragraph(child)
+            elif child.tag == W + 'tbl':
+                yield self._table(child)
+            elif child.tag == W + 'sdt':
+                content = child.find(W + 'sdtContent')
+                if content is not None:
+                    yield from self._blocks(content)
+
+    def _paragraph(self, paragraph):
+        tag = 'p'
+        styles = []
+        prefix = ''
+        props = paragraph.find(W + 'pPr')
+        if props is not None:
+            style = props.find(W + 'pStyle')
+            style_id = style.get(W + 'val', '') if style is not None else ''
+            tag = HEADING_STYLES.get(style_id.lower().replace(' ', ''), 'p')
+            align = props.find(W + 'jc')
+            if align is not None and align.get(W + 'val') in ALIGNMENTS:
+                styles.append(f"text-align: {ALIGNMENTS[align.get(W + 'val')]}")
+            if props.find(W + 'numPr') is not None or style_id in self.list_styles:
+                # Danh sách đánh số / gạch đầu dòng: hiển thị như bullet
+                styles.append('display: list-item; margin-left: 2em')
+            if _on(props, 'pageBreakBefore'):
+                prefix = '<hr class="page-break">'
+
+        inner = ''.join(self._inline(paragraph)) or '<br>'
+        style_attr = f' style="{"; ".join(styles)}"' if styles else ''
+        return f'{prefix}<{tag}{style_attr}>{inner}</{tag}>'
+
+    def _inline(self, parent):
+        for child in parent:
+            if child.tag == W + 'r':
+                yield self._run(child)
+            elif child.tag == W + 'hyperlink':
+                yield self._hyperlink(child)
+            elif child.tag in INLINE_CONTAINERS:
+                yield from self._inline(child)
+            elif child.tag == W + 'sdt':
+                content = child.find(W + 'sdtContent')
+                if content is not None:
+                    yield from self._inline(content)
+            elif child.tag in (M + 'oMath', M + 'oMathPara'):
+                text = ''.join(t.text or '' for t in child.iter(M + 't'))
+                yield f'<span class="docx-math">{html.escape(text)}</span>'
+
+    def _hyperlink(self, link):
+        inner = ''.join(self._inline(link))
+        target, mode = self.rels.get(link.get(R + 'id'), ('', None))
+        if mode == 'External' and target.lower().startswith(SAFE_LINK_PREFIXES):
+            return f'<a href="{html.escape(target)}" target="_blank" rel="noopener noreferrer">{inner}</a>'
+        return inner
+
+    def _run(self, run):
+        parts = []
+        for node in run:
+            if node.tag == W + 't':
+                parts.append(html.escape(node.text or ''))
+            elif node.tag == W + 'tab':
+                parts.append('&emsp;')
+            elif node.tag == W + 'br':
+                parts.append('<span class="page-break"></span>' if node.get(W + 'type') == 'page' else '<br>')
+            elif node.tag == W + 'cr':
+                parts.append('<br>')
+            elif node.tag == W + 'noBreakHyphen':
+                parts.append('-')
+            elif node.tag == W + 'drawing':
+                parts.extend(self._image(blip.get(R + 'embed')) for blip in node.iter(A + 'blip'))
+            elif node.tag in (W + 'pict', W + 'object'):
+                parts.extend(self._image(data.get(R + 'id')) for data in node.iter(V + 'imagedata'))
+
+        text = ''.join(parts)
+        if not text:
+            return ''
+        props = run.find(W + 'rPr')
+        if props is None:
+            return text
+
+        vert_align = props.find(W + 'vertAlign')
+        if vert_align is not None and vert_align.get(W + 'val') == 'superscript':
+            text = f'<sup>{text}</sup>'
+        elif vert_align is not None and vert_align.get(W + 'val') == 'subscript':
+            text = f'<sub>{text}</sub>'
+        if _on(props, 'strike') or _on(props, 'dstrike'):
+            text = f'<s>{text}</s>'
+        if _on(props, 'u'):
+            text = f'<u>{text}</u>'
+        if _on(props, 'i'):
+            text = f'<em>{text}</em>'
+        if _on(props, 'b'):
+            text = f'<strong>{text}</strong>'
+        return text
+
+    def _image(self, rel_id):
+        target, mode = self.rels.get(rel_id, ('', None))
+        if not target or mode == 'External':
+            return IMAGE_PLACEHOLDER
+        path = posixpath.normpath(posixpath.join('word', target)).lstrip('/')
+        mimetype = IMAGE_TYPES.get(posixpath.splitext(path)[1].lower())
+        try:
+            info = self.zip.getinfo(path)
+        except KeyError:
+            return IMAGE_PLACEHOLDER
+        if mimetype is None or info.file_size > self.max_image_bytes:
+            return IMAGE_PLACEHOLDER
+
+        self.images += 1
+        data = base64.b64encode(self.zip.read(info)).decode('ascii')
+        return f'<img src="data:{mimetype};base64,{data}" alt="" style="max-width: 100%">'
+
+    def _table(self, table):
+        rows = []
+        for row in table.findall(W + 'tr'):
+            cells = []
+            for cell in row.findall(W + 'tc'):
+                props = cell.find(W + 'tcPr')
+                attrs = ''
+                if props is not None:
+                    span = props.find(W + 'gridSpan')
+                    if span is not None and span.get(W + 'val', '1').isdigit() and int(span.get(W + 'val')) > 1:
+                        attrs = f' colspan="{int(span.get(W + "val"))}"'
+                    merge = props.find(W + 'vMerge')
+                    if merge is not None and merge.get(W + 'val') != 'restart':
+                        # Ô nối dọc: nội dung nằm ở ô đầu tiên
+                        cells.append(f'<td{attrs}></td>')
+                        continue
+                cells.append(f'<td{attrs}>{"".join(self._blocks(cell))}</td>')
+            rows.append(f'<tr>{"".join(cells)}</tr>')
+        return f'<table class="docx-table">{"".join(rows)}</table>'
+
+def docx_to_html(content, max_image_bytes=1024 * 1024):
+    """
+    Convert a .docx into HTML blocks
+
+    Args:
+        content: .docx file content as bytes
+        max_image_bytes: Larger images are replaced by a placeholder
+
+    Returns:
+        {'blocks': [...], 'images': number of embedded images}
+
+    Raises:
+        ValueError: Not a valid .docx file
+    """
+    try:
+        converter = DocxConverter(content, max_image_bytes)
+        blocks = converter.convert()
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        raise ValueError(f"Not a valid .docx file: {e}")
+    return {'blocks': blocks, 'images': converter.images}
@@ -3,39 +3,158 @@ import json
 import re
 from flask import Flask, render_template, request, jsonify, send_from_directory, abort, send_file, session, redirect, url_for, Response
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file as werkzeug_send_file
+from jinja2 import FileSystemBytecodeCache
 from datetime import datetime
-import io
-import zipfile
+from urllib.parse import quote
+import gzip
+import time
+import hmac
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import wraps
 from google_drive_manager import GoogleDriveManager
+from metadata_store import MetadataStore
+from hidden_files_store import HiddenFilesStore
+from search_index import SearchIndex, INDEXABLE_EXTENSIONS
+from question_index import QuestionIndex
+from parsed_cache import ParsedFileCache
+from static_assets import StaticAssets
+from docx_preview import docx_to_html
+from sitemap import SitemapBuilder
+import metrics
+from profiler import RequestProfiler
+from resumable_uploads import ResumableUploadStore, UploadError
+import jobs
+from zip_writer import ZipWriter
+from archive_cache import ArchiveCache
+from structured_log import configure_logging, get_logger, instrument_app as log_requests
 from dotenv import load_dotenv
 from authlib.integrations.flask_client import OAuth
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Logging: hàng đợi + thread ghi riêng, request không phải chờ ghi stdout
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # text (key=value) hoặc json
+LOG_SLOW_REQUEST_MS = int(os.environ.get('LOG_SLOW_REQUEST_MS', 1000))
+LOG_ERROR_BURST = int(os.environ.get('LOG_ERROR_BURST', 10))  # cùng một lỗi: tối đa N dòng mỗi phút
+configure_logging(LOG_LEVEL, LOG_FORMAT, error_burst=LOG_ERROR_BURST)
+log = get_logger('app')
+
 UPLOAD_FOLDER = 'uploaded'
 DATA_FOLDER = 'Data'
-METADATA_FOLDER = 'metadata'
+METADATA_FOLDER = 'metadata'  # Thư mục metadata cũ (mỗi file một JSON), chỉ dùng để import
+METADATA_DB = 'metadata.db'
 HIDDEN_FILES_JSON = 'hidden_files.json'
+SEARCH_INDEX_PATH = 'search_index.json.gz'
+QUESTIONS_DB = 'questions.db'
+PARSED_CACHE_FOLDER = 'parsed_cache'
+PREVIEW_CACHE_FOLDER = 'preview_cache'
+JINJA_CACHE_FOLDER = 'jinja_cache'  # Bytecode của template đã compile
+JOBS_DB = 'jobs.db'
+ARCHIVE_CACHE_FOLDER = 'archive_cache'  # File zip đã tạo, key = danh sách file + phiên bản từng file
+UPLOAD_SESSIONS_FOLDER = 'upload_sessions'  # Upload chia chunk đang dở (state .json + spool .part)
+PROFILES_FOLDER = 'profiles'  # cProfile của request được chọn (.prof + tóm tắt .json)
+STATIC_FOLDER = 'static'
+STATIC_BUILD_FOLDER = 'static_build'  # Output của static_assets.py (fingerprint + gzip/brotli + WebP/AVIF)
+
+# Dọn dẹp UPLOAD_FOLDER chạy nền (giây / bytes)
+UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 3600))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 200 * 1024 * 1024))
+UPLOAD_JANITOR_INTERVAL = int(os.environ.get('UPLOAD_JANITOR_INTERVAL', 300))
+
+# Upload chia chunk (resumable): bytes mỗi lần gửi lên Drive, giây giữ upload dở
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_SESSION_MAX_AGE = int(os.environ.get('UPLOAD_SESSION_MAX_AGE', 24 * 3600))
+
+# Job queue: số worker process (0 = chạy riêng bằng `python jobs.py worker`), số lần thử, giây giữ kết quả
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RESULT_MAX_AGE = int(os.environ.get('JOB_RESULT_MAX_AGE', 24 * 3600))
+JOB_WORKER = os.environ.get('JOB_WORKER') == '1'  # Process này là worker của job queue (jobs.py)
+
+# File zip: mức deflate cho JSON/TXT (file đã nén như .docx/.pdf/ảnh được lưu nguyên),
+# số thread nén song song (0 = số CPU), file từ kích thước này được nén song song theo block
+ZIP_COMPRESS_LEVEL = int(os.environ.get('ZIP_COMPRESS_LEVEL', 6))
+ZIP_WORKERS = int(os.environ.get('ZIP_WORKERS', 0))
+ZIP_PARALLEL_MIN_BYTES = int(os.environ.get('ZIP_PARALLEL_MIN_BYTES', 2 * 1024 * 1024))
+
+# Cache file zip trên đĩa (bytes, xóa file dùng lâu nhất trước khi vượt giới hạn)
+ARCHIVE_CACHE_MAX_BYTES = int(os.environ.get('ARCHIVE_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# Reverse proxy gửi file local (DATA_FOLDER, archive_cache) thay cho Flask:
+# off, x-accel (nginx X-Accel-Redirect, URI = X_ACCEL_PREFIX + path tương đối), x-sendfile (Apache / lighttpd)
+SENDFILE_MODE = os.environ.get('SENDFILE_MODE', 'off').lower()
+X_ACCEL_PREFIX = '/' + os.environ.get('X_ACCEL_PREFIX', '/_protected/').strip('/') + '/'
+
+# Ingestion JSON code chạy nền
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+INGEST_CACHE_SIZE = int(os.environ.get('INGEST_CACHE_SIZE', 64))
+INGEST_COMPRESS = os.environ.get('INGEST_COMPRESS', 'true').lower() == 'true'
+
+# Cache danh sách file trong storage (giây)
+LISTING_CACHE_TTL = int(os.environ.get('LISTING_CACHE_TTL', 30))
+
+# Chỉ trích nội dung file nhỏ hơn giới hạn này để đưa vào search index (bytes)
+SEARCH_MAX_BYTES = int(os.environ.get('SEARCH_MAX_BYTES', 20 * 1024 * 1024))
+
+# Số file đã parse giữ trong RAM (ngoài bản gzip trên đĩa)
+PARSED_CACHE_SIZE = int(os.environ.get('PARSED_CACHE_SIZE', 32))
+
+# Preview DOCX phía server: số block (đoạn / bảng) mỗi trang, ảnh lớn hơn giới hạn không nhúng (bytes)
+PREVIEW_PAGE_SIZE = int(os.environ.get('PREVIEW_PAGE_SIZE', 100))
+PREVIEW_MAX_IMAGE_BYTES = int(os.environ.get('PREVIEW_MAX_IMAGE_BYTES', 1024 * 1024))
+
+# Địa chỉ public của site (sitemap.xml)
+SITE_URL = os.environ.get('SITE_URL', 'https://lms.liemsdai.is-best.net').rstrip('/')
+
+# Static assets: tự build khi static/ mới hơn manifest; max-age cho URL chưa fingerprint (giây)
+STATIC_AUTO_BUILD = os.environ.get('STATIC_AUTO_BUILD', 'true').lower() == 'true'
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+# /metrics: admin đăng nhập, hoặc Prometheus gửi "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiler: profile ~1/N request (0 = tắt) và request có header X-Profile-Token ký bằng PROFILE_SECRET
+PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET', '')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 if not os.path.exists(DATA_FOLDER):
     os.makedirs(DATA_FOLDER)
-if not os.path.exists(METADATA_FOLDER):
-    os.makedirs(METADATA_FOLDER)
+if not os.path.exists(JINJA_CACHE_FOLDER):
+    os.makedirs(JINJA_CACHE_FOLDER)
 
-app = Flask(__name__)
+# static_folder=None: /static do route static_files bên dưới phục vụ (bản build có fingerprint)
+app = Flask(__name__, static_folder=None)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max
 
+# Jinja bytecode cache: worker mới không phải compile lại template (admin.html ~60KB)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_FOLDER)
+
+# Số request / latency / bytes của từng route cho /metrics
+metrics.instrument_app(app)
+log_requests(app, slow_threshold=LOG_SLOW_REQUEST_MS / 1000)
+
+# Profile request theo mẫu / theo header ký, xem ở /admin/profiles (super admin)
+request_profiler = RequestProfiler(PROFILES_FOLDER, PROFILE_SAMPLE_RATE, PROFILE_SECRET, PROFILE_KEEP)
+request_profiler.instrument_app(app, exclude=('static', 'metrics_endpoint', 'admin_profiles', 'admin_profile'))
+
 # ProxyFix: Trust X-Forwarded-* headers from Render proxy
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Load secret key from environment variable (IMPORTANT: Set this in .env file)
 app.secret_key = os.environ.get('SECRET_KEY', 'default-dev-key-change-in-production')
 if app.secret_key == 'default-dev-key-change-in-production':
-    print("⚠️ WARNING: Using default secret key. Set SECRET_KEY in .env file!")
+    log.warning("⚠️ Using default secret key. Set SECRET_KEY in .env file!")
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
@@ -59,48 +178,53 @@ google = oauth.register(
 # Google Drive setup
 USE_GOOGLE_DRIVE = os.environ.get('USE_GOOGLE_DRIVE', 'false').lower() == 'true'
 DRIVE_FOLDER_ID = os.environ.get('DRIVE_FOLDER_ID', None)
+DRIVE_NUM_RETRIES = int(os.environ.get('DRIVE_NUM_RETRIES', 3))  # Retry request Drive lỗi 5xx / 429 / mạng
 
 # Metadata functions
+metadata_store = MetadataStore(METADATA_DB)
+metadata_store.import_legacy_folder(METADATA_FOLDER)
+_data_folder_mtime = {'value': None}  # st_mtime_ns của DATA_FOLDER ở lần đối chiếu cuối
+
+def sync_data_folder():
+    """
+    Đối chiếu metadata_store với DATA_FOLDER khi mtime của thư mục đổi (file chép vào / xóa /
+    đổi tên ngoài app): chỉ một stat nếu không đổi. Upload / xóa trong app tự cập nhật store.
+    """
+    mtime = os.stat(DATA_FOLDER).st_mtime_ns
+    if mtime != _data_folder_mtime['value']:
+        metadata_store.sync_folder(DATA_FOLDER)
+        _data_folder_mtime['value'] = mtime
+
+sync_data_folder()
+
 def save_file_metadata(filename, uploader):
     """Save metadata about file upload"""
-    metadata_file = os.path.join(METADATA_FOLDER, f"{filename}.json")
-    metadata = {
-        'filename': filename,
-        'uploader': uploader,
-        'upload_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
     try:
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        stat = os.stat(os.path.join(DATA_FOLDER, filename))
+        metadata_store.save(
+            filename,
+            uploader=uploader,
+            upload_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            size=stat.st_size,
+            mtime=stat.st_mtime
+        )
     except Exception as e:
-        print(f"Error saving metadata: {e}")
+        log.error("Error saving metadata", file=filename, error=e)
 
 def get_file_metadata(filename):
     """Get metadata about file upload"""
-    metadata_file = os.path.join(METADATA_FOLDER, f"{filename}.json")
-    if os.path.exists(metadata_file):
-        try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error reading metadata: {e}")
+    try:
+        return metadata_store.get(filename)
+    except Exception as e:
+        log.error("Error reading metadata", file=filename, error=e)
     return None
 
 # Hidden files management functions
-def load_hidden_files():
-    """Load danh sách file ẩn từ JSON"""
-    if os.path.exists(HIDDEN_FILES_JSON):
-        try:
-            with open(HIDDEN_FILES_JSON, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+hidden_files_store = HiddenFilesStore(HIDDEN_FILES_JSON)
 
-def save_hidden_files(hidden_list):
-    """Lưu danh sách file ẩn vào JSON"""
-    with open(HIDDEN_FILES_JSON, 'w', encoding='utf-8') as f:
-        json.dump(hidden_list, f, ensure_ascii=False, indent=2)
+def load_hidden_files():
+    """Load danh sách file ẩn (cache trong bộ nhớ, chỉ đọc lại JSON khi file thay đổi)"""
+    return sorted(hidden_files_store.snapshot())
 
 def is_super_admin():
     """Kiểm tra xem user hiện tại có phải super admin không"""
@@ -114,68 +238,226 @@ def is_admin():
     admin_email = session.get('admin_email', '')
     return admin_email.lower() in [email.lower() for email in ADMIN_EMAILS]
 
+# File listing service
+_listing_cache = {'version': None, 'entries': [], 'by_name': {}, 'expires': 0}
+_listing_lock = threading.Lock()
+_file_listing_views = {}  # (listing version, hidden version, super admin) -> (etag, files)
+
+def list_storage_entries():
+    """
+    Lấy danh sách file trong storage (Drive hoặc local) dạng chuẩn hóa, cache LISTING_CACHE_TTL giây
+    
+    Returns:
+        (version, entries) - version là hash nội dung danh sách (giống nhau giữa các worker),
+        entries là list dict name, size, modified, uploader, etag (+ id với Drive)
+    """
+    with _listing_lock:
+        if _listing_cache['version'] is not None and time.time() < _listing_cache['expires']:
+            metrics.record_cache('listing', True)
+            return _listing_cache['version'], _listing_cache['entries']
+        metrics.record_cache('listing', False)
+        
+        entries = []
+        if drive_manager:
+            for file in drive_manager.list_files():
+                properties = file.get('properties', {})
+                entries.append({
+                    'id': file['id'],
+                    'name': file['name'],
+                    'size': int(file.get('size', 0)),
+                    'modified': file.get('modifiedTime', ''),
+                    'uploader': properties.get('uploader', 'Unknown'),
+                    # File Google Docs gốc không có md5Checksum
+                    'etag': file.get('md5Checksum') or f"{file['id']}-{file.get('modifiedTime', '')}"
+                })
+        else:
+            sync_data_folder()
+            for metadata in metadata_store.list_files():
+                entries.append({
+                    'name': metadata['filename'],
+                    'size': metadata['size'] or 0,
+                    'modified': datetime.fromtimestamp(metadata['mtime']).strftime('%Y-%m-%d %H:%M:%S') if metadata['mtime'] else '',
+                    'uploader': metadata['uploader'] or 'Unknown',
+                    'etag': f"{metadata['mtime'] or 0}-{metadata['size'] or 0}"
+                })
+        
+        version = hashlib.sha1(json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest()
+        if version != _listing_cache['version']:
+            _file_listing_views.clear()
+        _listing_cache.update(
+            version=version,
+            entries=entries,
+            by_name={entry['name']: entry for entry in entries},
+            expires=time.time() + LISTING_CACHE_TTL
+        )
+        return version, entries
+
+def get_storage_entry(filename):
+    """Tra cứu một file trong danh sách storage đã cache"""
+    list_storage_entries()
+    return _listing_cache['by_name'].get(filename)
+
+def invalidate_listing():
+    """Bỏ cache danh sách file sau khi upload / xóa"""
+    with _listing_lock:
+        _listing_cache['expires'] = 0
+
+def build_file_listing(super_admin):
+    """
+    Gom storage entries, metadata và trạng thái ẩn trong một lượt
+    
+    Returns:
+        (etag, files) - view models cho /admin/files, cache theo phiên bản danh sách và file ẩn
+    """
+    version, entries = list_storage_entries()
+    hidden_files, hidden_version = hidden_files_store.state()
+    key = (version, hidden_version, super_admin)
+    
+    cached = _file_listing_views.get(key)
+    metrics.record_cache('file_listing', cached is not None)
+    if cached:
+        return cached
+    
+    files = []
+    for entry in entries:
+        is_hidden = entry['name'] in hidden_files
+        # Skip hidden files if not super admin
+        if is_hidden and not super_admin:
+            continue
+        files.append({
+            'name': entry['name'],
+            'size': entry['size'],
+            'modified': entry['modified'],
+            'uploader': entry['uploader'],
+            'hidden': is_hidden
+        })
+    
+    etag = hashlib.sha1(f"{version}:{hidden_version}:{super_admin}".encode('utf-8')).hexdigest()
+    if len(_file_listing_views) > 32:
+        _file_listing_views.clear()
+    _file_listing_views[key] = (etag, files)
+    return etag, files
+
 def get_visible_files():
     """Lấy danh sách file mà user hiện tại được phép thấy"""
-    if drive_manager:
-        all_files = [f['name'] for f in drive_manager.list_files()]
-    else:
-        all_files = [f for f in os.listdir(DATA_FOLDER) if os.path.isfile(os.path.join(DATA_FOLDER, f))]
-    
-    # Nếu là super admin (minhmuc), thấy tất cả file
-    if is_super_admin():
-        return all_files
+    _, files = build_file_listing(is_super_admin())
+    return [f['name'] for f in files]
+
+# Upload folder janitor
+def purge_upload_folder(now=None):
+    """
+    Xóa file quá hạn trong UPLOAD_FOLDER và giữ tổng dung lượng dưới UPLOAD_MAX_BYTES
     
-    # Nếu không phải super admin, loại bỏ các file bị ẩn
-    hidden_files = load_hidden_files()
-    visible_files = [f for f in all_files if f not in hidden_files]
+    Returns:
+        Số file đã xóa
+    """
+    now = now or time.time()
+    entries = []
+    with os.scandir(UPLOAD_FOLDER) as it:
+        for entry in it:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
     
-    return visible_files
+    # File cũ nhất trước: vừa hết hạn trước, vừa bị loại trước khi vượt giới hạn dung lượng
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if now - mtime <= UPLOAD_MAX_AGE and total_size <= UPLOAD_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("⚠️ Could not remove upload", file=path, error=e)
+            continue
+        total_size -= size
+    return removed
+
+def _upload_janitor_loop():
+    while True:
+        time.sleep(UPLOAD_JANITOR_INTERVAL)
+        try:
+            removed = purge_upload_folder()
+            if removed:
+                log.info("🗑️ Upload janitor removed files", count=removed)
+            expired = upload_store.purge()
+            if expired:
+                log.info("🗑️ Upload janitor removed unfinished uploads", count=expired)
+            purged = job_queue.purge(JOB_RESULT_MAX_AGE)
+            if purged:
+                log.info("🗑️ Upload janitor removed finished jobs", count=purged)
+            archive_cache.purge_temp()
+        except Exception:
+            log.exception("⚠️ Upload janitor error")
 
-print(f"🔧 USE_GOOGLE_DRIVE: {USE_GOOGLE_DRIVE}")
-print(f"🔧 DRIVE_FOLDER_ID: {DRIVE_FOLDER_ID}")
+def start_upload_janitor():
+    """Chạy dọn dẹp UPLOAD_FOLDER trong thread nền thay vì trên mỗi request"""
+    thread = threading.Thread(target=_upload_janitor_loop, name='upload-janitor', daemon=True)
+    thread.start()
+    return thread
+
+if not JOB_WORKER:
+    start_upload_janitor()
+
+log.info("🔧 Storage", use_google_drive=USE_GOOGLE_DRIVE, drive_folder_id=DRIVE_FOLDER_ID)
+if SENDFILE_MODE not in ('off', 'x-accel', 'x-sendfile'):
+    log.warning("⚠️ Unknown SENDFILE_MODE, files are sent by Flask", sendfile_mode=SENDFILE_MODE)
 
 # Initialize Google Drive if enabled
 drive_manager = None
 if USE_GOOGLE_DRIVE:
-    print("🚀 Initializing Google Drive...")
+    log.info("🚀 Initializing Google Drive...")
     try:
         if not os.path.exists('credentials.json'):
-            print("❌ credentials.json not found!")
+            log.error("❌ credentials.json not found!")
             drive_manager = None
         else:
-            print("✅ credentials.json found")
             drive_manager = GoogleDriveManager(
                 credentials_file='credentials.json',
-                folder_id=DRIVE_FOLDER_ID
+                folder_id=DRIVE_FOLDER_ID,
+                num_retries=DRIVE_NUM_RETRIES
             )
-            print(f"✅ Google Drive enabled with folder ID: {DRIVE_FOLDER_ID or 'ROOT'}")
-    except Exception as e:
-        print(f"❌ Google Drive initialization failed: {e}")
-        import traceback
-        traceback.print_exc()
+            log.info("✅ Google Drive enabled", folder_id=DRIVE_FOLDER_ID or 'ROOT')
+    except Exception:
+        log.exception("❌ Google Drive initialization failed")
         drive_manager = None
 else:
-    print("ℹ️ Google Drive disabled - using local storage")
+    log.info("ℹ️ Google Drive disabled - using local storage")
+
+upload_store = ResumableUploadStore(
+    UPLOAD_SESSIONS_FOLDER,
+    data_folder=DATA_FOLDER,
+    drive_manager=drive_manager,
+    chunk_size=UPLOAD_CHUNK_SIZE,
+    max_size=app.config['MAX_CONTENT_LENGTH'],
+    max_age=UPLOAD_SESSION_MAX_AGE
+)
 
-print(f"🔧 ADMIN_EMAILS: {', '.join(ADMIN_EMAILS)}")
-print(f"🔧 SUPER_ADMIN_EMAIL: {SUPER_ADMIN_EMAIL}")
+job_queue = jobs.JobQueue(JOBS_DB, max_attempts=JOB_MAX_ATTEMPTS)
+archive_cache = ArchiveCache(ARCHIVE_CACHE_FOLDER, max_bytes=ARCHIVE_CACHE_MAX_BYTES)
+
+log.info("🔧 Admins", admin_emails=','.join(ADMIN_EMAILS), super_admin_email=SUPER_ADMIN_EMAIL)
+
+def extract_questions_from_data(data):
+    """Helper function to extract questions from different JSON structures"""
+    # Cấu trúc mới: {'test': [...]}
+    if 'test' in data and isinstance(data['test'], list):
+        return data['test']
+    # Cấu trúc cũ: {'data': [{'test': [...]}]}
+    elif 'data' in data and isinstance(data['data'], list) and len(data['data']) > 0:
+        if 'test' in data['data'][0]:
+            return data['data'][0]['test']
+    return []
 
 def parse_questions(files=None, json_codes=None, id_filter=None):
     result = {}
     idx = 1
     errors = []
     
-    def extract_questions_from_data(data):
-        """Helper function to extract questions from different JSON structures"""
-        # Cấu trúc mới: {'test': [...]}
-        if 'test' in data and isinstance(data['test'], list):
-            return data['test']
-        # Cấu trúc cũ: {'data': [{'test': [...]}]}
-        elif 'data' in data and isinstance(data['data'], list) and len(data['data']) > 0:
-            if 'test' in data['data'][0]:
-                return data['data'][0]['test']
-        return []
-    
     def process_question(question, idx):
         """Process a single question based on its type"""
         question_id = question['id']
@@ -197,6 +479,7 @@ def parse_questions(files=None, json_codes=None, id_filter=None):
             "ID": question_id,
             "Loại": question_type,
             "Câu": f"Câu {idx}: {question_cleaned}",
+            "Nội dung": question_cleaned,
         }
         
         # Handle different question types
@@ -311,42 +594,499 @@ def parse_questions(files=None, json_codes=None, id_filter=None):
                 
     return list(result.values()), errors
 
+def group_questions(questions):
+    """
+    Đánh số lại câu hỏi chính và gom câu con theo Parent_ID trong một lượt duyệt
+
+    Args:
+        questions: Danh sách câu hỏi đã sắp xếp (kết quả của parse_questions)
+
+    Returns:
+        (main_questions, groups) - danh sách câu hỏi chính và dict Parent_ID -> các câu con theo thứ tự
+    """
+    main_questions = []
+    groups = {}
+    main_idx = 1
+    for question in questions:
+        parent_id = question.get('Parent_ID')
+        if parent_id is not None:
+            # Câu con (đúng/sai, câu ghép, đáp án điền) - không đánh số
+            groups.setdefault(parent_id, []).append(question)
+            continue
+        question['Câu'] = f"Câu {main_idx}: {question['Nội dung']}"
+        main_questions.append(question)
+        main_idx += 1
+    return main_questions, groups
+
 def clean_html(raw_html):
     cleanr = re.compile('<.*?>')
     cleantext = re.sub(cleanr, '', raw_html)
     cleantext = re.sub(r'&nbsp;|&amp;|&quot;|&lt;|&gt;', ' ', cleantext)
     return cleantext.strip()
 
+# JSON code ingestion pipeline
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='ingest')
+ingest_jobs = OrderedDict()  # content hash -> Future, giữ tối đa INGEST_CACHE_SIZE job gần nhất
+ingest_lock = threading.Lock()
+
+def _ingest_spool_path(content_hash, compressed):
+    return os.path.join(UPLOAD_FOLDER, f"json_code_{content_hash}.txt{'.gz' if compressed else ''}")
+
+def _ingest_result_path(content_hash):
+    return os.path.join(UPLOAD_FOLDER, f"json_code_{content_hash}.result.json")
+
+def _ingest_owner_path(content_hash):
+    return os.path.join(UPLOAD_FOLDER, f"json_code_{content_hash}.owner")
+
+def _write_ingest_spool(content_hash, json_code):
+    """Ghi JSON code xuống đĩa trước khi trả 202: mọi worker process đọc được ngay"""
+    spool_path = _ingest_spool_path(content_hash, INGEST_COMPRESS)
+    temp_path = f"{spool_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if INGEST_COMPRESS:
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            f.write(json_code)
+    else:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json_code)
+    os.replace(temp_path, spool_path)
+
+def _ingest_owner_alive(content_hash):
+    """Process đang parse JSON code này còn sống không (pid ghi trong file .owner)"""
+    try:
+        with open(_ingest_owner_path(content_hash), 'r', encoding='utf-8') as f:
+            pid = int(f.read())
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # Process của user khác nhưng vẫn tồn tại
+    except (OSError, ValueError):
+        return False
+    return True
+
+def _ingest_json_code(content_hash, json_code):
+    """Worker: parse JSON code đã spool và lưu kết quả theo content hash"""
+    questions, errors = parse_questions(json_codes=[json_code])
+    result = {'questions': questions, 'errors': errors}
+    
+    # Ghi kết quả ra file để worker process khác cũng đọc được
+    result_path = _ingest_result_path(content_hash)
+    temp_path = f"{result_path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(temp_path, result_path)
+    try:
+        os.remove(_ingest_owner_path(content_hash))
+    except FileNotFoundError:
+        pass
+    return result
+
+def _start_ingest(content_hash, json_code):
+    """Đưa job parse vào executor của process này (ghi pid vào file .owner)"""
+    with ingest_lock:
+        future = ingest_jobs.get(content_hash)
+        if future is not None:
+            ingest_jobs.move_to_end(content_hash)
+            return future
+        with open(_ingest_owner_path(content_hash), 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+        future = ingest_jobs[content_hash] = ingest_executor.submit(_ingest_json_code, content_hash, json_code)
+        while len(ingest_jobs) > INGEST_CACHE_SIZE:
+            ingest_jobs.popitem(last=False)
+        return future
+
+def submit_json_code(json_code):
+    """
+    Đưa JSON code vào hàng đợi parse nền
+    
+    Returns:
+        Content hash (sha256) để client poll kết quả
+    """
+    content_hash = hashlib.sha256(json_code.encode('utf-8')).hexdigest()
+    with ingest_lock:
+        if content_hash in ingest_jobs:
+            ingest_jobs.move_to_end(content_hash)
+            return content_hash
+    if not os.path.exists(_ingest_result_path(content_hash)):
+        _write_ingest_spool(content_hash, json_code)
+        _start_ingest(content_hash, json_code)
+    return content_hash
+
+def _ingest_future_result(future, wait):
+    try:
+        return 'done', future.result(timeout=None if wait else 0)
+    except FutureTimeoutError:
+        return 'pending', None
+    except Exception as e:
+        return 'error', {'questions': [], 'errors': [f"JSON code có lỗi: {e}"]}
+
+def get_ingest_result(content_hash, wait=False):
+    """
+    Lấy kết quả parse của JSON code đã gửi
+    
+    Args:
+        content_hash: Hash trả về từ submit_json_code
+        wait: Chờ job đang chạy / parse lại từ file spool nếu chưa có kết quả
+    
+    Returns:
+        (status, result) với status là 'done', 'pending', 'error' hoặc 'not_found'
+    """
+    with ingest_lock:
+        future = ingest_jobs.get(content_hash)
+    
+    if future is not None:
+        return _ingest_future_result(future, wait)
+    
+    result_path = _ingest_result_path(content_hash)
+    if os.path.exists(result_path):
+        try:
+            with open(result_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            metrics.record_cache('ingest', True)
+            return 'done', result
+        except (OSError, ValueError) as e:
+            log.warning("⚠️ Could not read ingest result", hash=content_hash, error=e)
+    
+    # Job đang chạy ở worker process khác: chỉ còn file spool
+    for compressed in (True, False):
+        spool_path = _ingest_spool_path(content_hash, compressed)
+        if not os.path.exists(spool_path):
+            continue
+        owner_alive = _ingest_owner_alive(content_hash)
+        if owner_alive and not wait:
+            return 'pending', None
+        opener = gzip.open if compressed else open
+        with opener(spool_path, 'rt', encoding='utf-8') as f:
+            json_code = f.read()
+        metrics.record_cache('ingest', False)
+        if not owner_alive:
+            # Process nhận job đã chết trước khi có kết quả: parse lại như job mới ở process này
+            return _ingest_future_result(_start_ingest(content_hash, json_code), wait)
+        questions, errors = parse_questions(json_codes=[json_code])
+        return 'done', {'questions': questions, 'errors': errors}
+    
+    return 'not_found', None
+
+# Library indexing (search index + question dedup index + câu hỏi đã parse, chạy nền)
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+search_index.load()
+question_index = QuestionIndex(QUESTIONS_DB)
+parsed_cache = ParsedFileCache(PARSED_CACHE_FOLDER, PARSED_CACHE_SIZE)
+preview_cache = ParsedFileCache(PREVIEW_CACHE_FOLDER, memory_size=4)  # HTML có ảnh nhúng -> giữ ít trong RAM
+library_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='library')
+_library_sync = {'version': None, 'future': None}
+_library_sync_lock = threading.Lock()
+
+def read_storage_file(filename, entry=None):
+    """
+    Đọc nội dung một file trong storage (Drive hoặc local)
+    
+    Returns:
+        bytes hoặc None nếu không tìm thấy
+    """
+    if drive_manager:
+        entry = entry or get_storage_entry(filename)
+        if not entry:
+            return None
+        return drive_manager.download_file_to_memory(entry['id'])
+    
+    filepath = os.path.join(DATA_FOLDER, filename)
+    if not os.path.isfile(filepath):
+        return None
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+def _wants_content(entry):
+    return entry['name'].lower().endswith(INDEXABLE_EXTENSIONS) and entry['size'] <= SEARCH_MAX_BYTES
+
+def is_question_file(filename):
+    return filename.lower().endswith(('.json', '.txt'))
+
+def parse_stored_file(filename, content):
+    """Parse một file JSON/TXT trong storage giống hệt /dev (parse_questions)"""
+    questions, errors = parse_questions(json_codes=[content.decode('utf-8', errors='replace')])
+    # parse_questions báo lỗi theo "JSON code" -> đổi thành tên file cho dễ hiểu
+    errors = [error.replace('JSON code', f'File {filename}', 1) for error in errors]
+    return {'questions': questions, 'errors': errors}
+
+def get_parsed_questions(filename, entry=None):
+    """
+    Lấy câu hỏi đã parse của một file trong storage (parse và lưu cache nếu chưa có)
+    
+    Returns:
+        {'questions': [...], 'errors': [...]} hoặc None nếu không tìm thấy file
+    """
+    entry = entry or get_storage_entry(filename)
+    if not entry:
+        return None
+    result = parsed_cache.get(filename, entry['etag'])
+    metrics.record_cache('parsed', result is not None)
+    if result is None:
+        content = read_storage_file(filename, entry)
+        if content is None:
+            return None
+        result = parse_stored_file(filename, content)
+        parsed_cache.put(filename, entry['etag'], result)
+    return result
+
+def get_docx_preview(filename, entry=None):
+    """
+    Lấy HTML preview của một file .docx (convert một lần mỗi version, lưu cache)
+    
+    Returns:
+        {'blocks': [...], 'images': n} hoặc None nếu không tìm thấy file
+    
+    Raises:
+        ValueError: File không phải .docx hợp lệ
+    """
+    entry = entry or get_storage_entry(filename)
+    if not entry:
+        return None
+    preview = preview_cache.get(filename, entry['etag'])
+    metrics.record_cache('preview', preview is not None)
+    if preview is None:
+        content = read_storage_file(filename, entry)
+        if content is None:
+            return None
+        preview = docx_to_html(content, max_image_bytes=PREVIEW_MAX_IMAGE_BYTES)
+        preview_cache.put(filename, entry['etag'], preview)
+    return preview
+
+def _index_content(entry, content):
+    """Cập nhật search index và question index cho một file"""
+    search_index.add(entry['name'], content, entry['etag'])
+    
+    questions = []
+    if content is not None and is_question_file(entry['name']):
+        try:
+            questions = extract_questions_from_data(json.loads(content.decode('utf-8')))
+        except (ValueError, TypeError, KeyError):
+            questions = []
+        try:
+            parsed_cache.put(entry['name'], entry['etag'], parse_stored_file(entry['name'], content))
+        except Exception as e:
+            log.warning("⚠️ Could not cache parsed questions", file=entry['name'], error=e)
+    try:
+        question_index.index_file(entry['name'], entry['etag'], questions)
+    except Exception as e:
+        log.warning("⚠️ Could not index questions", file=entry['name'], error=e)
+
+def _index_file(filename, content=None):
+    """Worker: index một file vừa upload (content có sẵn thì không cần tải lại từ Drive)"""
+    entry = get_storage_entry(filename)
+    if not entry:
+        return
+    if content is None and _wants_content(entry):
+        content = read_storage_file(filename, entry)
+    _index_content(entry, content)
+    search_index.save()
+
+def _remove_from_indexes(filename):
+    question_index.remove_file(filename)
+    parsed_cache.remove(filename)
+    preview_cache.remove(filename)
+    search_index.save()
+
+def _sync_library_indexes():
+    """Worker: đồng bộ các index với danh sách storage hiện tại"""
+    version, entries = list_storage_entries()
+    search_versions = search_index.versions()
+    question_versions = question_index.versions()
+    current = {entry['name'] for entry in entries}
+    changed = False
+    
+    for filename in set(search_versions) | set(question_versions):
+        if filename not in current:
+            search_index.remove(filename)
+            question_index.remove_file(filename)
+            parsed_cache.remove(filename)
+            preview_cache.remove(filename)
+            changed = True
+    
+    for entry in entries:
+        wants_content = _wants_content(entry)
+        up_to_date = (search_versions.get(entry['name']) == entry['etag']
+                      and question_versions.get(entry['name']) == entry['etag'])
+        if up_to_date and wants_content and is_question_file(entry['name']):
+            up_to_date = parsed_cache.has(entry['name'], entry['etag'])
+        if up_to_date:
+            continue
+        try:
+            content = read_storage_file(entry['name'], entry) if wants_content else None
+            _index_content(entry, content)
+            changed = True
+        except Exception as e:
+            log.warning("⚠️ Could not index file", file=entry['name'], error=e)
+    
+    if changed:
+        search_index.save()
+        log.info("🔎 Library indexes synced", files=len(entries))
+    _library_sync['version'] = version
+
+def sync_library_indexes():
+    """
+    Đồng bộ search / question index ở nền khi danh sách storage đổi
+    (upload / xóa ở worker khác, file thêm tay, khởi động)
+    """
+    with _library_sync_lock:
+        future = _library_sync['future']
+        if future is not None and not future.done():
+            return
+        if _library_sync['version'] is not None and _library_sync['version'] == list_storage_entries()[0]:
+            return
+        _library_sync['future'] = library_executor.submit(_sync_library_indexes)
+
+def on_file_uploaded(filename, content=None):
+    """Cập nhật listing và index sau khi upload một file"""
+    invalidate_listing()
+    library_executor.submit(_index_file, filename, content)
+    if filename.lower().endswith('.docx'):
+        # Convert preview ở job worker, lần mở /admin/preview đầu tiên không phải chờ
+        job_queue.submit('prepare_file', {'filename': filename}, priority=-1)
+
+def on_file_deleted(filename):
+    """Cập nhật listing và index sau khi xóa một file"""
+    invalidate_listing()
+    search_index.remove(filename)
+    library_executor.submit(_remove_from_indexes, filename)
+
+if not JOB_WORKER:
+    library_executor.submit(sync_library_indexes)
+
+# Page cache cho các trang tĩnh của khách
+_page_cache = {}  # (template, context, static assets version) -> (etag, html)
+_page_cache_lock = threading.Lock()
+
+def render_cached_page(template_name, **context):
+    """
+    Render trang không phụ thuộc user một lần rồi dùng lại (ETag + 304)
+    
+    Theme (sáng / tối) nằm ở localStorage phía client nên không cần vào key;
+    context chỉ được chứa giá trị hữu hạn (vd. thông báo lỗi cố định).
+    Key có version static assets vì url_for trả về tên có fingerprint.
+    """
+    if app.jinja_env.auto_reload:
+        # Debug / TEMPLATES_AUTO_RELOAD: luôn render lại
+        return render_template(template_name, **context)
+    
+    key = (template_name, tuple(sorted(context.items())), static_assets.version)
+    cached = _page_cache.get(key)
+    metrics.record_cache('page', cached is not None)
+    if cached is None:
+        html = render_template(template_name, **context)
+        cached = (hashlib.sha1(html.encode('utf-8')).hexdigest(), html)
+        with _page_cache_lock:
+            if len(_page_cache) > 64:
+                _page_cache.clear()
+            _page_cache[key] = cached
+    
+    etag, html = cached
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
+def warm_templates():
+    """Load mọi template lúc khởi động (từ bytecode cache nếu có)"""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            log.warning("⚠️ Could not compile template", template=name, error=e)
+
+warm_templates()
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    response = render_template('index.html')
-    # Xóa tất cả các tệp trong thư mục uploaded
-    for filename in os.listdir(UPLOAD_FOLDER):
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-    return response
+    return render_cached_page('index.html')
+
 @app.route('/save_json_code', methods=['POST'])
 def save_json_code():
     data = request.get_json()
     json_code = data.get('json_code')
     if json_code:
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
-        filename = f'uploaded_json_code_{timestamp}.txt'
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(json_code)
-        return jsonify(success=True, filename=filepath)
+        content_hash = submit_json_code(json_code)
+        return jsonify(
+            success=True,
+            hash=content_hash,
+            status_url=url_for('ingest_status', content_hash=content_hash)
+        ), 202
     return jsonify(success=False)
 
-@app.route('/static/<path:filename>')
+@app.route('/ingest/<content_hash>')
+def ingest_status(content_hash):
+    """Poll trạng thái / lấy kết quả parse của JSON code đã gửi"""
+    if not re.fullmatch(r'[0-9a-f]{64}', content_hash):
+        abort(400, description="Invalid hash")
+    
+    status, result = get_ingest_result(content_hash)
+    if status == 'not_found':
+        return jsonify({'status': status}), 404
+    
+    response = {'status': status}
+    if result:
+        response.update(result, total=len(result['questions']))
+    return jsonify(response)
+
+# Static assets
+static_assets = StaticAssets(STATIC_FOLDER, STATIC_BUILD_FOLDER)
+static_assets.load()
+
+def _build_static_assets():
+    try:
+        static_assets.build()
+    except Exception:
+        log.exception("⚠️ Static asset build failed, serving static/ as is")
+
+if STATIC_AUTO_BUILD and not JOB_WORKER and static_assets.is_stale():
+    # Build nền (nén ảnh mất vài giây): trong lúc đó vẫn phục vụ manifest cũ / static/ gốc
+    threading.Thread(target=_build_static_assets, name='static-build', daemon=True).start()
+
+@app.url_defaults
+def static_asset_url(endpoint, values):
+    """url_for('static', filename=...) trả về tên có fingerprint"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_assets.url_path(values['filename'])
+
+@app.route('/static/<path:filename>', endpoint='static')
 def static_files(filename):
-    return app.send_static_file(filename)
+    # Chỉ nhận định dạng / encoding client ghi rõ (không tính */*)
+    accept_types = {value for value, quality in request.accept_mimetypes if quality > 0}
+    accept_encodings = {value for value, quality in request.accept_encodings if quality > 0}
+    asset = static_assets.select(filename, accept_types, accept_encodings)
+    if asset is None:
+        # File chưa có trong manifest (thêm sau lần build cuối)
+        return send_from_directory(STATIC_FOLDER, filename, max_age=STATIC_MAX_AGE)
+    
+    response = send_file(asset['path'], mimetype=asset['mimetype'])
+    if asset['encoding']:
+        response.headers['Content-Encoding'] = asset['encoding']
+    for header in asset['vary']:
+        response.vary.add(header)
+    if asset['immutable']:
+        # Nội dung đổi thì URL đổi -> cache vĩnh viễn
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}'
+    return response
 
 @app.route('/ping')
 def ping():
     return "pong", 200
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics (route, Google Drive, cache) - chỉ admin hoặc scraper có METRICS_TOKEN"""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization.encode('utf-8'), f"Bearer {METRICS_TOKEN}".encode('utf-8'))
+    if not token_ok and not (session.get('admin_logged_in') and is_admin()):
+        response = Response('Unauthorized\n', status=401, mimetype='text/plain')
+        response.headers['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    
+    response = Response(metrics.registry.render(), mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/test-drive')
 def test_drive():
     """Endpoint to test Google Drive connection"""
@@ -374,7 +1114,58 @@ from flask import send_from_directory, abort
 
 @app.route('/casual')
 def casual():
-    return render_template('casual.html')
+    # ?file= / ?autodownload= chỉ được JS đọc, HTML giống nhau
+    return render_cached_page('casual.html')
+
+@app.route('/casual/view/<path:filename>')
+def casual_view(filename):
+    """Xem câu hỏi của một file trong thư viện (parse sẵn từ lúc upload, không cần tải về rồi nhập lại ở /dev)"""
+    # Security check: prevent path traversal attacks
+    if '..' in filename or filename.startswith('/'):
+        abort(400, description="Invalid filename")
+    if not is_question_file(filename):
+        abort(400, description="Only .json/.txt files can be viewed")
+    
+    try:
+        super_admin = is_super_admin()
+        if not super_admin and filename in hidden_files_store.snapshot():
+            abort(404, description="File not found")
+        entry = get_storage_entry(filename)
+        if not entry:
+            abort(404, description="File not found")
+        
+        as_json = request.args.get('format') == 'json'
+        etag = f"{entry['etag']}-questions"
+        if as_json and etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            result = get_parsed_questions(filename, entry)
+            if result is None:
+                abort(404, description="File not found")
+            
+            if as_json:
+                response = jsonify({
+                    'file': filename,
+                    'total': len(result['questions']),
+                    'questions': result['questions'],
+                    'errors': result['errors']
+                })
+            else:
+                # Copy vì group_questions đánh số lại trực tiếp trên từng câu hỏi (kết quả cache dùng chung)
+                sorted_questions = sorted((dict(q) for q in result['questions']), key=lambda x: x['ID'])
+                main_questions, groups = group_questions(sorted_questions)
+                return render_template('Dev.html', questions=main_questions, groups=groups, errors=result['errors'],
+                                       total_questions=len(sorted_questions), view_file=filename)
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache' if super_admin else 'public, no-cache'
+        response.vary.add('Cookie')
+        return response
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        abort(500, description=str(e))
 
 @app.route('/redirect-to-ad')
 def redirect_to_ad():
@@ -405,19 +1196,90 @@ def redirect_to_ad():
 @app.route('/api/data-files')
 def data_files():
     try:
-        if drive_manager:
-            # List from Google Drive
-            drive_files = drive_manager.list_files()
-            files = [f['name'] for f in drive_files]
-        else:
-            # List from local storage
-            files = os.listdir(DATA_FOLDER)
-            files = [f for f in files if os.path.isfile(os.path.join(DATA_FOLDER, f))]
+        # File ẩn không hiển thị ở Casual mode
+        super_admin = is_super_admin()
+        etag, files = build_file_listing(super_admin)
         
-        return jsonify(files)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = jsonify([f['name'] for f in files])
+        response.set_etag(etag)
+        # Super admin thấy cả file ẩn -> không để proxy/CDN dùng chung response
+        response.headers['Cache-Control'] = 'private, no-cache' if super_admin else 'public, no-cache'
+        response.vary.add('Cookie')
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/search')
+def search_files():
+    """Tìm file theo tên và nội dung (không phân biệt dấu tiếng Việt)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify([])
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+    except ValueError:
+        limit = 50
+    
+    try:
+        sync_library_indexes()
+        visible_files = set(get_visible_files())
+        return jsonify(search_index.search(query, limit=limit, allowed=visible_files))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/questions/seen', methods=['POST'])
+def questions_seen():
+    """Kiểm tra các câu hỏi trong JSON code đã có trong thư viện chưa (trùng hoặc gần trùng)"""
+    data = request.get_json(silent=True) or {}
+    json_code = data.get('json_code')
+    if not json_code:
+        return jsonify({'error': 'Missing json_code'}), 400
+    
+    try:
+        questions = extract_questions_from_data(json.loads(json_code))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'JSON code không đúng định dạng: {e}'}), 400
+    
+    try:
+        sync_library_indexes()
+        visible_files = set(get_visible_files())
+        results = question_index.lookup(questions, allowed=visible_files)
+        return jsonify({
+            'total': len(results),
+            'seen': sum(1 for r in results if r['exact'] or r['near']),
+            'questions': results
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def send_local_file(path, **kwargs):
+    """
+    send_file cho file local; với SENDFILE_MODE Flask chỉ trả header (cùng ETag / 304 / Content-Disposition)
+    và reverse proxy đọc file, worker thread rảnh ngay
+    
+    Args:
+        path: File trên đĩa (tương đối với thư mục làm việc)
+        **kwargs: Như send_file (as_attachment, download_name, mimetype, etag, ...)
+    """
+    path = os.path.abspath(path)
+    if SENDFILE_MODE == 'x-accel':
+        relative = os.path.relpath(path)
+        if relative.startswith('..'):
+            return send_file(path, **kwargs)  # Ngoài thư mục app: nginx không map được
+    elif SENDFILE_MODE != 'x-sendfile':
+        return send_file(path, **kwargs)
+    
+    response = werkzeug_send_file(path, request.environ, use_x_sendfile=True,
+                                  response_class=app.response_class,
+                                  max_age=app.get_send_file_max_age, **kwargs)
+    if SENDFILE_MODE == 'x-accel':
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + quote(relative.replace(os.sep, '/'))
+    return response
+
 @app.route('/download/data/<path:filename>')
 def download_data_file(filename):
     # Security check: prevent path traversal attacks
@@ -425,28 +1287,53 @@ def download_data_file(filename):
         abort(400, description="Invalid filename")
     
     try:
+        entry = get_storage_entry(filename)
+        # ETag mạnh: md5Checksum của Drive hoặc mtime+size của file local (stat lúc phục vụ: listing có thể cũ)
+        etag = entry['etag'] if entry else None
+        if not drive_manager:
+            try:
+                stat = os.stat(os.path.join(DATA_FOLDER, filename))
+                etag = f"{stat.st_mtime}-{stat.st_size}"
+            except OSError:
+                etag = None
+        if etag and etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'public, no-cache'
+            return response
+        
         if drive_manager:
             # Download from Google Drive to temp location
             import tempfile
             temp_dir = tempfile.gettempdir()
             temp_path = os.path.join(temp_dir, filename)
             
-            success = drive_manager.download_file_by_name(filename, temp_path)
+            if entry:
+                success = drive_manager.download_file(entry['id'], temp_path)
+            else:
+                success = drive_manager.download_file_by_name(filename, temp_path)
             
             if success and os.path.exists(temp_path):
-                response = send_file(temp_path, as_attachment=True, download_name=filename)
+                response = send_file(temp_path, as_attachment=True, download_name=filename, etag=etag or True)
                 # Clean up temp file after sending
                 try:
                     os.remove(temp_path)
                 except:
                     pass
-                return response
             else:
                 abort(404, description="File not found on Drive")
         else:
             # Download from local storage
-            return send_from_directory(DATA_FOLDER, filename, as_attachment=True)
+            path = safe_join(DATA_FOLDER, filename)
+            if path is None or not os.path.isfile(path):
+                abort(404, description="File not found")
+            response = send_local_file(path, as_attachment=True, etag=etag or True)
+        
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response
     
+    except HTTPException:
+        raise
     except FileNotFoundError:
         abort(404, description="File not found")
     except Exception as e:
@@ -464,16 +1351,12 @@ def download_multiple_files():
         if '..' in filename or filename.startswith('/'):
             return jsonify({'error': 'Invalid filename detected'}), 400
 
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for filename in files:
-            file_path = os.path.join(data_folder, filename)
-            if os.path.isfile(file_path):
-                zf.write(file_path, arcname=filename)
-            else:
-                return jsonify({'error': f'File not found: {filename}'}), 404
-    memory_file.seek(0)
-    return send_file(memory_file, attachment_filename='selected_files.zip', as_attachment=True)
+    for filename in files:
+        if not os.path.isfile(os.path.join(data_folder, filename)):
+            return jsonify({'error': f'File not found: {filename}'}), 404
+    
+    _, path, _ = build_cached_zip(files, local=True)
+    return send_local_file(path, mimetype='application/zip', as_attachment=True, download_name='selected_files.zip')
 
 @app.route('/dev', methods=['GET', 'POST'])
 def dev():
@@ -483,6 +1366,7 @@ def dev():
         files = request.files.getlist('file')  # Lấy danh sách tệp được chọn
         json_code = request.form.get('json_code')  # Lấy JSON code từ form
         id_filter = request.form.get('id')  # Lấy giá trị ID từ form
+        ingest_hashes = request.form.getlist('ingest')  # JSON code đã gửi qua /save_json_code
         if files:
             questions_file, errors_file = parse_questions(files=files, id_filter=id_filter)  # Thêm câu hỏi vào danh sách
             questions.update({q['ID']: q for q in questions_file})
@@ -491,25 +1375,23 @@ def dev():
             questions_code, errors_code = parse_questions(json_codes=[json_code], id_filter=id_filter)  # Thêm câu hỏi từ JSON code
             questions.update({q['ID']: q for q in questions_code})
             errors.extend(errors_code)
+        for content_hash in ingest_hashes:
+            status, result = get_ingest_result(content_hash, wait=True)
+            if result is None:
+                errors.append(f"JSON code {content_hash[:12]} đã hết hạn, vui lòng nhập lại")
+                continue
+            # Copy vì group_questions đánh số lại trực tiếp trên từng câu hỏi
+            questions.update({q['ID']: dict(q) for q in result['questions'] if not id_filter or q['ID'] == id_filter})
+            errors.extend(result['errors'])
 
     # Sắp xếp các câu hỏi theo ID
     sorted_questions = sorted(questions.values(), key=lambda x: x['ID'])
 
-    # Đánh số lại chỉ các câu hỏi chính (không phải câu con)
-    main_idx = 1
-    for question in sorted_questions:
-        # Chỉ đánh số câu hỏi chính, bỏ qua câu con
-        if not question.get('Là câu ghép') and not question.get('Là đáp án điền'):
-            question['Câu'] = f"Câu {main_idx}: {question['Câu'].split(': ', 1)[1]}"
-            main_idx += 1
-    
-    # Xóa tất cả các tệp trong thư mục uploaded
-    for filename in os.listdir(UPLOAD_FOLDER):
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
+    # Đánh số lại câu hỏi chính và gom câu con theo câu cha
+    main_questions, groups = group_questions(sorted_questions)
+    
     total_questions = len(sorted_questions)
-    return render_template('Dev.html', questions=sorted_questions, errors=errors, total_questions=total_questions)
+    return render_template('Dev.html', questions=main_questions, groups=groups, errors=errors, total_questions=total_questions)
 
 # Admin authentication decorator
 def admin_required(f):
@@ -531,7 +1413,7 @@ def admin_login():
         error_message = '🚫 Từ chối truy cập: Bạn là ai?'
     elif error == 'oauth_failed':
         error_message = '❌ Lỗi xác thực: Không thể kết nối với Google'
-    return render_template('admin_login.html', error=error_message)
+    return render_cached_page('admin_login.html', error=error_message)
 
 # Admin OAuth redirect
 @app.route('/admin/oauth/login')
@@ -570,7 +1452,7 @@ def admin_callback():
         return redirect(url_for('admin'))
         
     except Exception as e:
-        print(f"OAuth callback error: {e}")
+        log.error("OAuth callback error", error=e)
         return redirect(url_for('admin_login', error='oauth_failed'))
 
 # Admin logout
@@ -587,8 +1469,6 @@ def admin():
     admin_name = session.get('admin_name', 'Admin')
     admin_picture = session.get('admin_picture', '')
     
-    # Get visible files based on user permission
-    visible_files = get_visible_files()
     hidden_files = load_hidden_files() if is_super_admin() else []
     
     return render_template(
@@ -623,6 +1503,14 @@ def admin_upload():
                     file_id = drive_manager.upload_file_object(file, file.filename, uploader_name)
                     if file_id:
                         uploaded_files.append(file.filename)
+                        # Giữ nội dung để index, tránh tải lại từ Drive
+                        content = None
+                        if file.filename.lower().endswith(INDEXABLE_EXTENSIONS):
+                            file.seek(0)
+                            content = file.read(SEARCH_MAX_BYTES + 1)
+                            if len(content) > SEARCH_MAX_BYTES:
+                                content = None
+                        on_file_uploaded(file.filename, content)
                     else:
                         errors.append(f"{file.filename}: Failed to upload to Drive")
                 else:
@@ -632,6 +1520,7 @@ def admin_upload():
                     uploaded_files.append(file.filename)
                     # Save metadata for local files
                     save_file_metadata(file.filename, uploader_name)
+                    on_file_uploaded(file.filename)
             except Exception as e:
                 errors.append(f"{file.filename}: {str(e)}")
     
@@ -641,56 +1530,83 @@ def admin_upload():
         'errors': errors
     })
 
+# Admin resumable upload: POST tạo upload, PATCH gửi từng chunk (header Upload-Offset),
+# HEAD / GET lấy offset để tiếp tục sau khi mất kết nối, POST .../complete để hoàn tất
+@app.errorhandler(UploadError)
+def upload_error(error):
+    response = jsonify({'error': str(error), 'offset': error.offset})
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response, error.status
+
+def _upload_response(state, status=200):
+    response = jsonify(state)
+    response.headers['Upload-Offset'] = str(state['offset'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response, status
+
+@app.route('/admin/uploads', methods=['POST'])
+@admin_required
+def admin_upload_create():
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not filename or '..' in filename or filename.startswith('/'):
+        return jsonify({'error': 'Invalid filename'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid size'}), 400
+    
+    state = upload_store.create(filename, size, session.get('admin_name', 'Admin'))
+    response, status = _upload_response(state, 201)
+    response.headers['Location'] = url_for('admin_upload_chunk', upload_id=state['id'])
+    return response, status
+
+@app.route('/admin/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@admin_required
+def admin_upload_status(upload_id):
+    return _upload_response(upload_store.get(upload_id))
+
+@app.route('/admin/uploads/<upload_id>', methods=['PATCH'])
+@admin_required
+def admin_upload_chunk(upload_id):
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Missing Upload-Offset header'}), 400
+    # request.stream: đọc body theo block, không spool cả chunk vào bộ nhớ / file tạm của Werkzeug
+    return _upload_response(upload_store.append(upload_id, offset, request.stream, request.content_length))
+
+@app.route('/admin/uploads/<upload_id>', methods=['DELETE'])
+@admin_required
+def admin_upload_cancel(upload_id):
+    upload_store.cancel(upload_id)
+    return '', 204
+
+@app.route('/admin/uploads/<upload_id>/complete', methods=['POST'])
+@admin_required
+def admin_upload_complete(upload_id):
+    state = upload_store.complete(upload_id)
+    if not drive_manager:
+        save_file_metadata(state['filename'], session.get('admin_name', 'Admin'))
+    on_file_uploaded(state['filename'])
+    return jsonify({'uploaded': state['filename'], 'file_id': state['file_id'], 'size': state['size']})
+
 # Admin list files
 @app.route('/admin/files')
 @admin_required
 def admin_files():
     try:
-        visible_files = get_visible_files()
-        hidden_files = load_hidden_files() if is_super_admin() else []
+        etag, files = build_file_listing(is_super_admin())
         
-        files = []
-        
-        if drive_manager:
-            # List from Google Drive
-            drive_files = drive_manager.list_files()
-            for file in drive_files:
-                # Skip hidden files if not super admin
-                if file['name'] not in visible_files and not is_super_admin():
-                    continue
-                
-                # Get uploader from properties
-                properties = file.get('properties', {})
-                uploader = properties.get('uploader', 'Unknown')
-                    
-                files.append({
-                    'name': file['name'],
-                    'size': file.get('size', 0),
-                    'modified': file.get('modifiedTime', ''),
-                    'uploader': uploader,
-                    'hidden': file['name'] in hidden_files
-                })
+        # Danh sách không đổi -> 304, không cần serialize lại
+        if etag in request.if_none_match:
+            response = Response(status=304)
         else:
-            # List from local storage
-            for filename in os.listdir(DATA_FOLDER):
-                # Skip hidden files if not super admin
-                if filename not in visible_files and not is_super_admin():
-                    continue
-                    
-                filepath = os.path.join(DATA_FOLDER, filename)
-                if os.path.isfile(filepath):
-                    size = os.path.getsize(filepath)
-                    modified = datetime.fromtimestamp(os.path.getmtime(filepath)).strftime('%Y-%m-%d %H:%M:%S')
-                    metadata = get_file_metadata(filename)
-                    files.append({
-                        'name': filename,
-                        'size': size,
-                        'modified': modified,
-                        'uploader': metadata['uploader'] if metadata else 'Unknown',
-                        'hidden': filename in hidden_files
-                    })
-        
-        return jsonify(files)
+            response = jsonify(files)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -706,6 +1622,7 @@ def admin_delete(filename):
             # Delete from Google Drive
             success = drive_manager.delete_file_by_name(filename)
             if success:
+                on_file_deleted(filename)
                 return jsonify({'success': True, 'message': f'Deleted {filename}'})
             else:
                 return jsonify({'error': 'File not found or delete failed'}), 404
@@ -714,12 +1631,85 @@ def admin_delete(filename):
             filepath = os.path.join(DATA_FOLDER, filename)
             if os.path.isfile(filepath):
                 os.remove(filepath)
+                metadata_store.delete(filename)
+                on_file_deleted(filename)
                 return jsonify({'success': True, 'message': f'Deleted {filename}'})
             else:
                 return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Server-side DOCX preview
+@app.route('/admin/preview/<path:filename>')
+@admin_required
+def admin_preview(filename):
+    """HTML preview của file .docx, trả theo trang (page, per_page tính theo đoạn / bảng)"""
+    # Security check: prevent path traversal attacks
+    if '..' in filename or filename.startswith('/'):
+        abort(400, description="Invalid filename")
+    if not filename.lower().endswith('.docx'):
+        return jsonify({'error': 'Only .docx files can be previewed'}), 400
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', PREVIEW_PAGE_SIZE, type=int), 1), 1000)
+    
+    try:
+        entry = get_storage_entry(filename)
+        if not entry:
+            return jsonify({'error': 'File not found'}), 404
+        
+        etag = f"{entry['etag']}-preview-{page}-{per_page}"
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            preview = get_docx_preview(filename, entry)
+            if preview is None:
+                return jsonify({'error': 'File not found'}), 404
+            
+            blocks = preview['blocks']
+            pages = max(1, -(-len(blocks) // per_page))
+            if page < 1 or page > pages:
+                return jsonify({'error': 'Page out of range', 'pages': pages}), 404
+            start = (page - 1) * per_page
+            response = jsonify({
+                'filename': filename,
+                'page': page,
+                'pages': pages,
+                'per_page': per_page,
+                'total_blocks': len(blocks),
+                'html': ''.join(blocks[start:start + per_page]),
+                'next': url_for('admin_preview', filename=filename, page=page + 1, per_page=per_page) if page < pages else None
+            })
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Merged export of stored questions without duplicates
+@app.route('/admin/questions/export')
+@admin_required
+def admin_questions_export():
+    """Gộp câu hỏi của nhiều file (mặc định tất cả), bỏ câu trùng / gần trùng"""
+    visible_files = get_visible_files()
+    allowed = set(visible_files)
+    filenames = [f for f in request.args.getlist('files') if f in allowed] or visible_files
+    
+    try:
+        questions, stats = question_index.export(filenames)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    response = Response(json.dumps({'test': questions}, ensure_ascii=False), mimetype='application/json')
+    response.headers['Content-Disposition'] = 'attachment; filename=merged_questions.json'
+    response.headers['X-Question-Groups'] = str(stats['groups'])
+    response.headers['X-Duplicates-Removed'] = str(stats['exact'] + stats['near'])
+    return response
+
 # Toggle file visibility (super admin only)
 @app.route('/admin/toggle_visibility', methods=['POST'])
 @admin_required
@@ -734,26 +1724,55 @@ def toggle_file_visibility():
     if not filename:
         return jsonify({'success': False, 'error': 'Missing filename'}), 400
     
-    hidden_files = load_hidden_files()
-    
-    if filename in hidden_files:
-        # Bỏ ẩn file
-        hidden_files.remove(filename)
-        action = 'unhidden'
-    else:
-        # Ẩn file
-        hidden_files.append(filename)
-        action = 'hidden'
-    
-    save_hidden_files(hidden_files)
+    # Ẩn / bỏ ẩn file (khóa + ghi atomic để không mất cập nhật khi toggle đồng thời)
+    action, hidden_files = hidden_files_store.toggle(filename)
     
     return jsonify({
         'success': True,
         'action': action,
         'filename': filename,
-        'hidden_files': hidden_files
+        'hidden_files': sorted(hidden_files)
     })
 
+# Request profiles (super admin only)
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """Các request chậm nhất đã được profile cùng hàm tốn thời gian nhất"""
+    if not is_super_admin():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), PROFILE_KEEP)
+    sort = 'time' if request.args.get('sort') == 'time' else 'duration'
+    profiles = request_profiler.list(limit=limit, sort=sort)
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'profiles': profiles})
+    return render_template('profiles.html', profiles=profiles, sort=sort,
+                           sample_rate=PROFILE_SAMPLE_RATE, header_enabled=bool(PROFILE_SECRET))
+
+@app.route('/admin/profiles/<profile_id>')
+@admin_required
+def admin_profile(profile_id):
+    """Báo cáo pstats của một profile, ?download=1 để tải file .prof (snakeviz, pstats)"""
+    if not is_super_admin():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    
+    if request.args.get('download'):
+        path = request_profiler.path(profile_id)
+        if path is None:
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f'{profile_id}.prof')
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        sort = 'cumulative'
+    report = request_profiler.report(profile_id, sort=sort)
+    if report is None:
+        abort(404)
+    response = Response(report, mimetype='text/plain')
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
 # Get hidden files list (super admin only)
 @app.route('/admin/hidden_files', methods=['GET'])
 @admin_required
@@ -766,54 +1785,192 @@ def get_hidden_files_route():
     return jsonify({'success': True, 'hidden_files': hidden_files})
 
 # SEO Routes
+_robots_cache = {}
+sitemap_builder = SitemapBuilder(SITE_URL)
+SITE_LASTMOD = datetime.now().strftime('%Y-%m-%d')  # Trang tĩnh đổi khi deploy lại
+
 @app.route('/robots.txt')
 def robots():
-    """Serve robots.txt file"""
-    return send_from_directory('.', 'robots.txt')
+    """Serve robots.txt file (đọc một lần, giữ trong RAM)"""
+    metrics.record_cache('robots', 'body' in _robots_cache)
+    if 'body' not in _robots_cache:
+        with open('robots.txt', 'rb') as f:
+            body = f.read()
+        _robots_cache.update(body=body, etag=hashlib.sha1(body).hexdigest())
+    
+    response = Response(_robots_cache['body'], mimetype='text/plain')
+    response.set_etag(_robots_cache['etag'])
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response.make_conditional(request)
+
+def _sitemap_urls():
+    """Trang chính + trang casual của từng file public, theo thứ tự tên file"""
+    _, entries = list_storage_entries()
+    hidden_files = hidden_files_store.snapshot()
+    
+    file_urls = []
+    for entry in sorted(entries, key=lambda e: e['name']):
+        if entry['name'] in hidden_files:
+            continue
+        # modified: ISO của Drive hoặc 'YYYY-MM-DD HH:MM:SS' của local -> lấy ngày
+        lastmod = entry['modified'][:10] or None
+        if is_question_file(entry['name']):
+            path = '/casual/view/' + quote(entry['name'])
+        else:
+            path = '/casual?file=' + quote(entry['name'], safe='')
+        file_urls.append((path, lastmod, 'monthly', '0.6'))
+    
+    library_lastmod = max([url[1] for url in file_urls if url[1]] + [SITE_LASTMOD])
+    return [
+        ('/', SITE_LASTMOD, 'daily', '1.0'),
+        ('/casual', library_lastmod, 'weekly', '0.8'),
+        ('/dev', SITE_LASTMOD, 'weekly', '0.8'),
+    ] + file_urls
+
+def _sitemap_response(name):
+    version = (list_storage_entries()[0], hidden_files_store.state()[1])
+    current = sitemap_builder.is_current(version)
+    metrics.record_cache('sitemap', current)
+    if not current:
+        sitemap_builder.update(version, _sitemap_urls())
+    
+    document = sitemap_builder.get(name)
+    if document is None:
+        abort(404)
+    etag, body = document
+    response = Response(body, mimetype='text/xml')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
 
 @app.route('/sitemap.xml')
 def sitemap():
-    """Generate dynamic sitemap.xml"""
-    pages = []
-    base_url = 'https://lms.liemsdai.is-best.net'
-    
-    # Main pages
-    pages.append({
-        'loc': f'{base_url}/',
-        'lastmod': datetime.now().strftime('%Y-%m-%d'),
-        'changefreq': 'daily',
-        'priority': '1.0'
-    })
+    """Sitemap (hoặc sitemap index khi quá 50.000 URL), build lại khi thư viện đổi"""
+    return _sitemap_response('sitemap.xml')
+
+@app.route('/sitemap-<int:number>.xml')
+def sitemap_part(number):
+    return _sitemap_response(f'sitemap-{number}.xml')
+
+def open_zip_writer(fileobj):
+    """ZipWriter với cấu hình ZIP_* (nén theo loại file, deflate song song file lớn)"""
+    return ZipWriter(fileobj, level=ZIP_COMPRESS_LEVEL, workers=ZIP_WORKERS or None,
+                     parallel_min=ZIP_PARALLEL_MIN_BYTES)
+
+def write_zip(filenames, fileobj, progress=None, local=None):
+    """
+    Ghi các file trong storage (Drive hoặc local) vào một file zip
     
-    pages.append({
-        'loc': f'{base_url}/casual',
-        'lastmod': datetime.now().strftime('%Y-%m-%d'),
-        'changefreq': 'weekly',
-        'priority': '0.8'
-    })
+    Args:
+        filenames: Tên file (tên không hợp lệ / không tìm thấy được bỏ qua)
+        fileobj: File đích (BytesIO hoặc file trên đĩa)
+        progress: Gọi progress(done, total) sau mỗi file (tùy chọn)
+        local: Đọc từ DATA_FOLDER kể cả khi dùng Drive (mặc định: theo storage đang dùng)
     
-    pages.append({
-        'loc': f'{base_url}/dev',
-        'lastmod': datetime.now().strftime('%Y-%m-%d'),
-        'changefreq': 'weekly',
-        'priority': '0.8'
-    })
+    Returns:
+        Số file đã ghi
+    """
+    if local is None:
+        local = not drive_manager
+    written = 0
+    with open_zip_writer(fileobj) as zf:
+        for index, filename in enumerate(filenames, 1):
+            if '..' in filename or filename.startswith('/'):
+                continue
+            
+            try:
+                if not local:
+                    # Download from Google Drive
+                    file_id = drive_manager.get_file_id_by_name(filename)
+                    if file_id:
+                        file_content = drive_manager.download_file_to_memory(file_id)
+                        if file_content:
+                            zf.add(filename, file_content)
+                            written += 1
+                else:
+                    # Read from local storage
+                    filepath = os.path.join(DATA_FOLDER, filename)
+                    if os.path.isfile(filepath):
+                        zf.add_file(filename, filepath)
+                        written += 1
+            except Exception as e:
+                log.error("Error adding file to zip", file=filename, error=e)
+            if progress:
+                progress(index, len(filenames))
+    return written
+
+def storage_versions(filenames, local=None):
+    """
+    Phiên bản hiện tại của từng file: etag của Drive (md5 / id + modifiedTime), mtime + size khi local
     
-    # Generate XML
-    sitemap_xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    sitemap_xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    Returns:
+        {filename: version}, version None khi file không tồn tại (tên không hợp lệ bị bỏ)
+    """
+    if local is None:
+        local = not drive_manager
+    versions = {}
+    for filename in filenames:
+        if '..' in filename or filename.startswith('/'):
+            continue
+        if local:
+            try:
+                stat = os.stat(os.path.join(DATA_FOLDER, filename))
+                versions[filename] = f"{stat.st_mtime_ns}-{stat.st_size}"
+            except OSError:
+                versions[filename] = None
+        else:
+            entry = get_storage_entry(filename)
+            versions[filename] = entry['etag'] if entry else None
+    if not local and None in versions.values():
+        # Listing có thể cũ hơn một lần upload -> đọc lại một lần, None nghĩa là không có trên Drive
+        invalidate_listing()
+        for filename, version in versions.items():
+            if version is None:
+                entry = get_storage_entry(filename)
+                versions[filename] = entry['etag'] if entry else None
+    return versions
+
+def zip_cache_key(filenames, local=None):
+    """
+    Returns:
+        (key trong archive_cache, versions) - cùng key khi cùng tập file, cùng phiên bản và cùng mức nén
+    """
+    versions = storage_versions(filenames, local)
+    return archive_cache.key(versions, f"level={ZIP_COMPRESS_LEVEL}"), versions
+
+def build_cached_zip(filenames, progress=None, local=None):
+    """
+    File zip của các file đã chọn, lấy từ archive_cache hoặc tạo mới rồi lưu vào cache
     
-    for page in pages:
-        sitemap_xml += '  <url>\n'
-        sitemap_xml += f'    <loc>{page["loc"]}</loc>\n'
-        sitemap_xml += f'    <lastmod>{page["lastmod"]}</lastmod>\n'
-        sitemap_xml += f'    <changefreq>{page["changefreq"]}</changefreq>\n'
-        sitemap_xml += f'    <priority>{page["priority"]}</priority>\n'
-        sitemap_xml += '  </url>\n'
+    Args:
+        filenames: Tên file (thứ tự không ảnh hưởng: file trong zip xếp theo tên)
+        progress: Gọi progress(done, total) sau mỗi file khi phải tạo mới (tùy chọn)
+        local: Đọc từ DATA_FOLDER kể cả khi dùng Drive
     
-    sitemap_xml += '</urlset>'
+    Returns:
+        (key, path của file zip trong cache, số file có trong zip)
+    """
+    key, versions = zip_cache_key(filenames, local)
+    files = sum(1 for version in versions.values() if version is not None)
+    path = archive_cache.get(key)
+    metrics.record_cache('archive', path is not None)
+    if path:
+        return key, path, files
     
-    return Response(sitemap_xml, mimetype='text/xml')
+    temp_path = archive_cache.temp_path()
+    try:
+        with open(temp_path, 'wb') as f:
+            written = write_zip(sorted(versions), f, progress, local)
+        if written < files:
+            # Thiếu file do lỗi tải -> key riêng để lần sau không lấy lại zip thiếu (vẫn bị evict như zip khác)
+            log.warning("⚠️ Incomplete zip not reused", files=files, written=written)
+            key = f"{key}-{time.time_ns()}"
+        files = written
+        path = archive_cache.put(key, temp_path)
+    finally:
+        archive_cache.discard(temp_path)
+    log.info("✅ Zip archive cached", files=files, bytes=os.path.getsize(path))
+    return key, path, files
 
 # Admin download multiple files as zip
 @app.route('/admin/download-multiple', methods=['POST'])
@@ -826,33 +1983,10 @@ def admin_download_multiple():
         if not filenames:
             return jsonify({'error': 'No files specified'}), 400
         
-        # Create zip file in memory
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for filename in filenames:
-                if '..' in filename or filename.startswith('/'):
-                    continue
-                
-                try:
-                    if drive_manager:
-                        # Download from Google Drive
-                        file_id = drive_manager.get_file_id_by_name(filename)
-                        if file_id:
-                            file_content = drive_manager.download_file_to_memory(file_id)
-                            if file_content:
-                                zf.writestr(filename, file_content)
-                    else:
-                        # Read from local storage
-                        filepath = os.path.join(DATA_FOLDER, filename)
-                        if os.path.isfile(filepath):
-                            zf.write(filepath, filename)
-                except Exception as e:
-                    print(f"Error adding {filename} to zip: {e}")
-                    continue
-        
-        memory_file.seek(0)
-        return send_file(
-            memory_file,
+        # Zip đã có trong cache (cùng file, cùng phiên bản) -> gửi thẳng từ đĩa
+        _, path, _ = build_cached_zip(filenames)
+        return send_local_file(
+            path,
             mimetype='application/zip',
             as_attachment=True,
             download_name=f'files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
@@ -860,6 +1994,95 @@ def admin_download_multiple():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Background jobs (jobs.py): handler chạy trong worker process, request chỉ xếp job và xem trạng thái
+@jobs.register('zip')
+def zip_job(payload, job):
+    """Zip các file đã chọn vào archive_cache (tải về qua /admin/jobs/<id>/download)"""
+    key, path, files = build_cached_zip(payload['files'],
+                                        lambda done, total: job.progress(done / total, f"{done}/{total} file"))
+    return {'key': key, 'files': files, 'size': os.path.getsize(path),
+            'download_name': payload['download_name']}
+
+@jobs.register('prepare_file')
+def prepare_file_job(payload, job):
+    """Parse câu hỏi / convert preview của một file vừa upload vào cache dùng chung trên đĩa"""
+    filename = payload['filename']
+    invalidate_listing()  # listing của worker process có thể cũ hơn lần upload
+    if filename.lower().endswith('.docx'):
+        preview = get_docx_preview(filename)
+        return {'found': preview is not None}
+    return {'found': get_parsed_questions(filename) is not None}
+
+def _job_view(job):
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': round(job['progress'], 3),
+        'message': job['message'],
+        'error': job['error'],
+        'attempts': job['attempts'],
+        'priority': job['priority'],
+        'owner': job['owner'],
+        'result': job['result'],
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+        'download_url': url_for('admin_job_download', job_id=job['id'])
+                        if job['kind'] == 'zip' and job['status'] == 'done' else None
+    }
+
+@app.route('/admin/jobs/zip', methods=['POST'])
+@admin_required
+def admin_job_zip():
+    data = request.get_json(silent=True) or {}
+    filenames = data.get('files', [])
+    if not filenames:
+        return jsonify({'error': 'No files specified'}), 400
+    
+    job_id = job_queue.submit('zip', {
+        'files': filenames,
+        'download_name': f'files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    }, priority=10, owner=session.get('admin_email'))
+    response = jsonify(_job_view(job_queue.get(job_id)))
+    response.headers['Location'] = url_for('admin_job', job_id=job_id)
+    return response, 202
+
+@app.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    jobs_list = job_queue.list(request.args.get('status'), limit=limit)
+    return jsonify({'counts': job_queue.counts(), 'jobs': [_job_view(job) for job in jobs_list]})
+
+@app.route('/admin/jobs/<int:job_id>', methods=['GET', 'DELETE'])
+@admin_required
+def admin_job(job_id):
+    if request.method == 'DELETE':
+        if not job_queue.cancel(job_id):
+            return jsonify({'error': 'Job already finished or not found'}), 409
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    response = jsonify(_job_view(job))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/jobs/<int:job_id>/download')
+@admin_required
+def admin_job_download(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['kind'] != 'zip' or job['status'] != 'done':
+        abort(404, description="Archive not found")
+    # Zip bị xóa khỏi cache (hết chỗ) -> tạo lại, file đổi từ lúc chạy job thì lấy phiên bản mới
+    path = archive_cache.get(job['result']['key']) or build_cached_zip(job['payload']['files'])[1]
+    return send_local_file(path, mimetype='application/zip', as_attachment=True,
+                           download_name=job['result']['download_name'])
+
+job_workers = jobs.WorkerPool('fromminhmoi', JOB_WORKERS, lock_path=f"{JOBS_DB}.workers.lock")
+if not JOB_WORKER:
+    job_workers.start()
+
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
@@ -5,22 +5,29 @@ Upload, download, list, and delete files from Google Drive
 
 import os
 import io
+import time
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from googleapiclient.errors import HttpError
+from metrics import drive_call, record_drive_error, record_drive_bytes
+from structured_log import configure_logging, get_logger
+
+log = get_logger('drive')
 
 class GoogleDriveManager:
-    def __init__(self, credentials_file='credentials.json', folder_id=None):
+    def __init__(self, credentials_file='credentials.json', folder_id=None, num_retries=3):
         """
         Initialize Google Drive Manager
         
         Args:
             credentials_file: Path to service account JSON file
             folder_id: Google Drive folder ID to store files (optional)
+            num_retries: Retries per API request on 5xx / 429 / network errors, with backoff
         """
         self.credentials_file = credentials_file
         self.folder_id = folder_id
+        self.num_retries = num_retries
         self.service = None
         self._authenticate()
     
@@ -31,7 +38,7 @@ class GoogleDriveManager:
             
             # Try OAuth first (token.json), fallback to Service Account
             if os.path.exists('token.json'):
-                print("🔑 Using OAuth authentication (token.json)")
+                log.info("🔑 Using OAuth authentication (token.json)")
                 from google.auth.transport.requests import Request
                 from google.oauth2.credentials import Credentials
                 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -43,10 +50,10 @@ class GoogleDriveManager:
                 # If no valid credentials, let user log in
                 if not creds or not creds.valid:
                     if creds and creds.expired and creds.refresh_token:
-                        print("🔄 Refreshing expired token...")
+                        log.info("🔄 Refreshing expired token...")
                         creds.refresh(Request())
                     else:
-                        print("⚠️ Need to authorize. Run setup script first!")
+                        log.error("⚠️ Need to authorize. Run setup script first!")
                         raise Exception("OAuth token not found or invalid")
                     
                     # Save credentials
@@ -54,19 +61,19 @@ class GoogleDriveManager:
                         token.write(creds.to_json())
                 
                 self.service = build('drive', 'v3', credentials=creds)
-                print("✅ OAuth authenticated successfully")
+                log.info("✅ OAuth authenticated successfully")
             else:
-                print("🔑 Using Service Account authentication (credentials.json)")
+                log.info("🔑 Using Service Account authentication (credentials.json)")
                 credentials = service_account.Credentials.from_service_account_file(
                     self.credentials_file, scopes=SCOPES)
                 self.service = build('drive', 'v3', credentials=credentials)
-                print("⚠️ Warning: Service Accounts have no storage quota!")
-                print("   Use OAuth authentication instead (create token.json)")
+                log.warning("⚠️ Service Accounts have no storage quota! Use OAuth authentication instead (create token.json)")
                 
         except Exception as e:
-            print(f"❌ Authentication error: {e}")
+            log.error("❌ Authentication error", error=e)
             raise
     
+    @drive_call
     def upload_file(self, file_path, filename=None):
         """
         Upload a file to Google Drive
@@ -83,11 +90,11 @@ class GoogleDriveManager:
                 filename = os.path.basename(file_path)
             
             if not os.path.exists(file_path):
-                print(f"❌ File not found: {file_path}")
+                log.error("❌ File not found", file=file_path)
                 return None
             
             file_size = os.path.getsize(file_path)
-            print(f"📄 Uploading {filename} ({file_size} bytes)")
+            log.debug("📄 Uploading", file=filename, bytes=file_size)
             
             file_metadata = {
                 'name': filename,
@@ -96,32 +103,32 @@ class GoogleDriveManager:
             # Add to folder if specified
             if self.folder_id:
                 file_metadata['parents'] = [self.folder_id]
-                print(f"📁 Uploading to folder: {self.folder_id}")
             
             media = MediaFileUpload(file_path, resumable=True)
             
-            print(f"🔄 Executing Drive API create...")
+            start = time.perf_counter()
             file = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id, name, size, createdTime'
-            ).execute()
+            ).execute(num_retries=self.num_retries)
             
-            print(f"✅ Uploaded: {filename} (ID: {file.get('id')}, Size: {file.get('size')})")
+            log.info("✅ Uploaded", file=filename, id=file.get('id'), bytes=file_size,
+                     folder=self.folder_id, duration=round(time.perf_counter() - start, 3))
+            record_drive_bytes('upload', file_size)
             return file.get('id')
         
         except HttpError as error:
-            print(f"❌ HTTP Error during upload: {error}")
-            print(f"   Error details: {error.error_details if hasattr(error, 'error_details') else 'N/A'}")
-            import traceback
-            traceback.print_exc()
+            record_drive_error(error)
+            log.exception("❌ HTTP Error during upload", file=filename,
+                          details=getattr(error, 'error_details', 'N/A'))
             return None
         except Exception as error:
-            print(f"❌ Unexpected error during upload: {error}")
-            import traceback
-            traceback.print_exc()
+            record_drive_error(error)
+            log.exception("❌ Unexpected error during upload", file=filename)
             return None
     
+    @drive_call
     def upload_file_object(self, file_object, filename, uploader=None):
         """
         Upload a file from memory (Flask file object)
@@ -136,22 +143,19 @@ class GoogleDriveManager:
         """
         temp_path = None
         try:
-            print(f"📤 Starting upload: {filename}")
-            
             file_metadata = {
                 'name': filename,
             }
             
             if self.folder_id:
                 file_metadata['parents'] = [self.folder_id]
-                print(f"📁 Target folder ID: {self.folder_id}")
             
             # Create temp directory if not exists (works on Windows & Linux)
             import tempfile
             temp_dir = tempfile.gettempdir()
             temp_path = os.path.join(temp_dir, filename)
             
-            print(f"💾 Saving to temp: {temp_path}")
+            log.debug("💾 Saving to temp", file=filename, path=temp_path)
             
             # Reset file pointer to beginning
             file_object.seek(0)
@@ -161,18 +165,13 @@ class GoogleDriveManager:
             
             # Verify file was saved
             if not os.path.exists(temp_path):
-                print(f"❌ Temp file not created: {temp_path}")
+                log.error("❌ Temp file not created", file=filename, path=temp_path)
                 return None
             
-            file_size = os.path.getsize(temp_path)
-            print(f"✅ Temp file saved: {file_size} bytes")
-            
             # Upload the temp file
-            print(f"☁️ Uploading to Google Drive...")
             result = self.upload_file(temp_path, filename)
             
             if result:
-                print(f"✅ Upload successful! File ID: {result}")
                 # Set uploader property if provided
                 if uploader:
                     from datetime import datetime
@@ -181,16 +180,15 @@ class GoogleDriveManager:
                         'upload_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     }
                     self.set_file_properties(result, properties)
-                    print(f"📝 Metadata saved: Uploaded by {uploader}")
+                    log.debug("📝 Metadata saved", file=filename, uploader=uploader)
             else:
-                print(f"❌ Upload failed - no file ID returned")
+                log.error("❌ Upload failed - no file ID returned", file=filename)
             
             return result
         
         except Exception as error:
-            print(f"❌ Upload error for {filename}: {error}")
-            import traceback
-            traceback.print_exc()
+            record_drive_error(error)
+            log.exception("❌ Upload error", file=filename)
             return None
         
         finally:
@@ -198,10 +196,139 @@ class GoogleDriveManager:
             if temp_path and os.path.exists(temp_path):
                 try:
                     os.remove(temp_path)
-                    print(f"🗑️ Cleaned up temp file: {temp_path}")
                 except Exception as e:
-                    print(f"⚠️ Could not clean temp file: {e}")
+                    log.warning("⚠️ Could not clean temp file", path=temp_path, error=e)
+    
+    def _resumable_http(self):
+        """requests session with the Drive credentials (googleapiclient only uploads a whole file in one call)"""
+        session = getattr(self, '_resumable_session', None)
+        if session is None:
+            from google.auth.transport.requests import AuthorizedSession
+            # service._http là AuthorizedHttp giữ credentials (OAuth hoặc service account)
+            session = self._resumable_session = AuthorizedSession(self.service._http.credentials)
+        return session
     
+    @staticmethod
+    def _committed_offset(response):
+        # 308 Resume Incomplete: Range "bytes=0-N" = Drive đã nhận N + 1 byte (không có Range = 0)
+        committed = response.headers.get('Range')
+        return int(committed.rsplit('-', 1)[1]) + 1 if committed else 0
+    
+    @drive_call
+    def create_upload_session(self, filename, size, uploader=None, mimetype=None):
+        """
+        Start a Drive resumable upload; chunks are sent later with upload_session_chunk
+        
+        Args:
+            filename: Name to save on Drive
+            size: Total size in bytes
+            uploader: Name of person uploading (optional, saved as file property)
+            mimetype: Content type (optional)
+        
+        Returns:
+            Session URI on success, None on failure
+        """
+        try:
+            file_metadata = {'name': filename}
+            if self.folder_id:
+                file_metadata['parents'] = [self.folder_id]
+            if uploader:
+                from datetime import datetime
+                file_metadata['properties'] = {
+                    'uploader': uploader,
+                    'upload_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            
+            response = self._resumable_http().post(
+                'https://www.googleapis.com/upload/drive/v3/files',
+                params={'uploadType': 'resumable', 'fields': 'id, name, size'},
+                json=file_metadata,
+                headers={
+                    'X-Upload-Content-Length': str(size),
+                    'X-Upload-Content-Type': mimetype or 'application/octet-stream'
+                }
+            )
+            response.raise_for_status()
+            log.debug("📄 Upload session created", file=filename, bytes=size)
+            return response.headers['Location']
+        except Exception as error:
+            record_drive_error(error)
+            log.error("❌ Upload session error", file=filename, error=error)
+            return None
+    
+    @drive_call
+    def upload_session_chunk(self, session_uri, data, offset, total):
+        """
+        Send the bytes [offset, offset + len(data)) of a resumable upload
+        
+        Args:
+            session_uri: Value returned by create_upload_session
+            data: Chunk, a multiple of 256 KB except for the last one
+            offset: Position of the chunk in the file
+            total: Total size in bytes
+        
+        Returns:
+            (offset committed by Drive, file ID once the upload is complete) or None on failure
+        """
+        try:
+            if data:
+                content_range = f"bytes {offset}-{offset + len(data) - 1}/{total}"
+            else:
+                content_range = f"bytes */{total}"  # file rỗng
+            response = self._resumable_http().put(
+                session_uri, data=data, headers={'Content-Range': content_range}, allow_redirects=False)
+            if response.status_code == 308:
+                committed = self._committed_offset(response)
+                record_drive_bytes('upload', committed - offset)
+                return committed, None
+            response.raise_for_status()
+            record_drive_bytes('upload', len(data))
+            return total, response.json().get('id')
+        except Exception as error:
+            record_drive_error(error)
+            log.error("❌ Upload chunk error", offset=offset, bytes=len(data), error=error)
+            return None
+    
+    @drive_call
+    def upload_session_status(self, session_uri, total):
+        """
+        Ask Drive how much of a resumable upload it has (after a failed chunk)
+        
+        Returns:
+            (offset committed by Drive, file ID if already complete) or None on failure
+        """
+        try:
+            response = self._resumable_http().put(
+                session_uri, headers={'Content-Range': f"bytes */{total}"}, allow_redirects=False)
+            if response.status_code == 308:
+                return self._committed_offset(response), None
+            response.raise_for_status()
+            return total, response.json().get('id')
+        except Exception as error:
+            record_drive_error(error)
+            log.error("❌ Upload status error", error=error)
+            return None
+    
+    @drive_call
+    def cancel_upload_session(self, session_uri):
+        """
+        Abort a resumable upload
+        
+        Returns:
+            True on success, False on failure
+        """
+        try:
+            response = self._resumable_http().delete(session_uri)
+            # Drive trả 499 khi hủy thành công
+            if response.status_code not in (204, 499):
+                response.raise_for_status()
+            return True
+        except Exception as error:
+            record_drive_error(error)
+            log.error("❌ Upload cancel error", error=error)
+            return False
+    
+    @drive_call
     def download_file(self, file_id, destination_path):
         """
         Download a file from Google Drive
@@ -220,16 +347,20 @@ class GoogleDriveManager:
             
             done = False
             while not done:
-                status, done = downloader.next_chunk()
+                status, done = downloader.next_chunk(num_retries=self.num_retries)
             
             file_handle.close()
-            print(f"✅ Downloaded to: {destination_path}")
+            size = os.path.getsize(destination_path)
+            record_drive_bytes('download', size)
+            log.debug("✅ Downloaded", id=file_id, path=destination_path, bytes=size)
             return True
         
         except HttpError as error:
-            print(f"❌ Download error: {error}")
+            record_drive_error(error)
+            log.error("❌ Download error", id=file_id, error=error)
             return False
     
+    @drive_call
     def download_file_to_memory(self, file_id):
         """
         Download a file to memory (returns bytes)
@@ -247,15 +378,18 @@ class GoogleDriveManager:
             
             done = False
             while not done:
-                status, done = downloader.next_chunk()
+                status, done = downloader.next_chunk(num_retries=self.num_retries)
             
+            record_drive_bytes('download', file_handle.tell())
             file_handle.seek(0)
             return file_handle.read()
         
         except HttpError as error:
-            print(f"❌ Download to memory error: {error}")
+            record_drive_error(error)
+            log.error("❌ Download to memory error", id=file_id, error=error)
             return None
     
+    @drive_call
     def download_file_by_name(self, filename, destination_path):
         """
         Download a file by its name
@@ -272,12 +406,14 @@ class GoogleDriveManager:
             if file_id:
                 return self.download_file(file_id, destination_path)
             else:
-                print(f"❌ File not found: {filename}")
+                log.warning("❌ File not found", file=filename)
                 return False
         except Exception as error:
-            print(f"❌ Error: {error}")
+            record_drive_error(error)
+            log.error("❌ Error", file=filename, error=error)
             return False
     
+    @drive_call
     def set_file_properties(self, file_id, properties):
         """
         Set custom properties for a file
@@ -293,18 +429,20 @@ class GoogleDriveManager:
             self.service.files().update(
                 fileId=file_id,
                 body={'properties': properties}
-            ).execute()
+            ).execute(num_retries=self.num_retries)
             return True
         except HttpError as error:
-            print(f"❌ Error setting properties: {error}")
+            record_drive_error(error)
+            log.error("❌ Error setting properties", id=file_id, error=error)
             return False
     
+    @drive_call
     def list_files(self):
         """
         List all files in the Drive folder
         
         Returns:
-            List of file dictionaries with name, id, size, modifiedTime, properties
+            List of file dictionaries with name, id, size, modifiedTime, md5Checksum, properties
         """
         try:
             query = f"'{self.folder_id}' in parents and trashed=false" if self.folder_id else "trashed=false"
@@ -312,16 +450,18 @@ class GoogleDriveManager:
             results = self.service.files().list(
                 q=query,
                 pageSize=1000,
-                fields="files(id, name, size, modifiedTime, mimeType, properties)"
-            ).execute()
+                fields="files(id, name, size, modifiedTime, mimeType, md5Checksum, properties)"
+            ).execute(num_retries=self.num_retries)
             
             files = results.get('files', [])
             return files
         
         except HttpError as error:
-            print(f"❌ List error: {error}")
+            record_drive_error(error)
+            log.error("❌ List error", error=error)
             return []
     
+    @drive_call
     def get_file_id_by_name(self, filename):
         """
         Get file ID by filename
@@ -341,7 +481,7 @@ class GoogleDriveManager:
                 q=query,
                 pageSize=1,
                 fields="files(id, name)"
-            ).execute()
+            ).execute(num_retries=self.num_retries)
             
             files = results.get('files', [])
             if files:
@@ -349,9 +489,11 @@ class GoogleDriveManager:
             return None
         
         except HttpError as error:
-            print(f"❌ Search error: {error}")
+            record_drive_error(error)
+            log.error("❌ Search error", file=filename, error=error)
             return None
     
+    @drive_call
     def delete_file(self, file_id):
         """
         Delete a file from Google Drive
@@ -363,14 +505,16 @@ class GoogleDriveManager:
             True on success, False on failure
         """
         try:
-            self.service.files().delete(fileId=file_id).execute()
-            print(f"✅ Deleted file ID: {file_id}")
+            self.service.files().delete(fileId=file_id).execute(num_retries=self.num_retries)
+            log.info("✅ Deleted", id=file_id)
             return True
         
         except HttpError as error:
-            print(f"❌ Delete error: {error}")
+            record_drive_error(error)
+            log.error("❌ Delete error", id=file_id, error=error)
             return False
     
+    @drive_call
     def delete_file_by_name(self, filename):
         """
         Delete a file by its name
@@ -386,12 +530,14 @@ class GoogleDriveManager:
             if file_id:
                 return self.delete_file(file_id)
             else:
-                print(f"❌ File not found: {filename}")
+                log.warning("❌ File not found", file=filename)
                 return False
         except Exception as error:
-            print(f"❌ Error: {error}")
+            record_drive_error(error)
+            log.error("❌ Error", file=filename, error=error)
             return False
     
+    @drive_call
     def get_file_info(self, filename):
         """
         Get file information
@@ -409,12 +555,15 @@ class GoogleDriveManager:
                     return file
             return None
         except Exception as error:
-            print(f"❌ Error: {error}")
+            record_drive_error(error)
+            log.error("❌ Error", file=filename, error=error)
             return None
 
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
+    
     # Initialize manager
     # Replace with your folder ID from Google Drive URL
     # Example: https://drive.google.com/drive/folders/1ABC...XYZ
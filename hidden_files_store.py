@@ -0,0 +1,123 @@
+"""
+Hidden Files Store for LMS Licker
+In-memory set of hidden files backed by hidden_files.json
+"""
+
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong process
+    fcntl = None
+
+log = get_logger('hidden_files')
+
+class HiddenFilesStore:
+    def __init__(self, path='hidden_files.json'):
+        """
+        Initialize Hidden Files Store
+
+        Args:
+            path: JSON file holding the list of hidden filenames
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.RLock()
+        self._hidden = frozenset()
+        self._mtime = None
+
+    def _reload_if_changed(self):
+        """Re-read the JSON file only when its mtime changed (other worker wrote it)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime == self._mtime:
+            return
+
+        hidden = frozenset()
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    hidden = frozenset(json.load(f))
+            except Exception as e:
+                log.warning("⚠️ Could not read hidden files", path=self.path, error=e)
+        self._hidden = hidden
+        self._mtime = mtime
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock + file lock so toggles from several workers don't lose updates"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, hidden):
+        """Atomic write: temp file in the same folder, then rename"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.hidden_files.', suffix='.tmp', dir=folder)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(sorted(hidden), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._hidden = frozenset(hidden)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def snapshot(self):
+        """
+        Get the current hidden files
+
+        Returns:
+            frozenset of hidden filenames
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return self._hidden
+
+    def state(self):
+        """
+        Get the current hidden files together with their version
+
+        Returns:
+            (hidden, version) - frozenset of filenames and mtime (ns) of the JSON file
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return self._hidden, self._mtime
+
+    def toggle(self, filename):
+        """
+        Hide a visible file or unhide a hidden one
+
+        Returns:
+            (action, hidden) - 'hidden' or 'unhidden' and the new frozenset
+        """
+        with self._locked():
+            self._reload_if_changed()
+            hidden = set(self._hidden)
+            if filename in hidden:
+                hidden.remove(filename)
+                action = 'unhidden'
+            else:
+                hidden.add(filename)
+                action = 'hidden'
+            self._write(hidden)
+            return action, self._hidden
@@ -0,0 +1,447 @@
+"""
+Job Queue for LMS Licker
+Durable background jobs in SQLite (priorities, retries, progress) run by a pool of
+worker processes, so heavy work (zip building, re-indexing) leaves the request handlers
+
+Usage:
+    python jobs.py worker [count]   # run workers outside the web server (then set JOB_WORKERS=0)
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import socket
+import sqlite3
+import importlib
+import threading
+import subprocess
+
+from structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: mỗi process web tự chạy pool riêng
+    fcntl = None
+
+log = get_logger('jobs')
+
+# Handler theo loại job: kind -> function(payload, job) -> result (JSON)
+_handlers = {}
+
+STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+def register(kind):
+    """
+    Register the handler of a job kind (in the module given to the workers):
+
+        @jobs.register('zip')
+        def build_zip_job(payload, job):
+            job.progress(0.5, "Nén file")
+            return {'path': ...}
+    """
+    def decorator(function):
+        _handlers[kind] = function
+        return function
+    return decorator
+
+class JobCancelled(Exception):
+    pass
+
+class JobQueue:
+    def __init__(self, db_path='jobs.db', max_attempts=3, retry_delay=10, lease=300):
+        """
+        Initialize Job Queue
+
+        Args:
+            db_path: Path to SQLite database file (WAL mode), shared by web and worker processes
+            max_attempts: Default number of tries of a job before it is marked failed
+            retry_delay: Seconds before the first retry, doubled on each further try
+            lease: Seconds without heartbeat after which a running job is given to another worker
+                (a thread renews it every lease / 3 while the handler runs)
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after REAL NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                owner TEXT,
+                worker TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                heartbeat REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, run_after, id)')
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def submit(self, kind, payload=None, priority=0, max_attempts=None, owner=None):
+        """
+        Queue a job
+
+        Args:
+            kind: Job kind (a registered handler)
+            payload: JSON-serializable arguments of the handler
+            priority: Higher runs first
+            max_attempts: Tries before the job is failed (default: queue setting)
+            owner: Who submitted the job (admin email), shown in status
+
+        Returns:
+            Job id
+        """
+        cursor = self._connect().execute('''
+            INSERT INTO jobs (kind, payload, priority, max_attempts, run_after, owner, created)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (kind, json.dumps(payload or {}, ensure_ascii=False), priority,
+              max_attempts or self.max_attempts, time.time(), owner, time.time()))
+        log.info("📥 Job queued", id=cursor.lastrowid, kind=kind, priority=priority)
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        """
+        Returns:
+            Job dict (payload and result decoded) or None
+        """
+        return self._row(self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def list(self, status=None, limit=50):
+        """Most recent jobs first, optionally only one status"""
+        if status:
+            rows = self._connect().execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit)).fetchall()
+        else:
+            rows = self._connect().execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs per status"""
+        rows = self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict({status: 0 for status in STATUSES}, **{row[0]: row[1] for row in rows})
+
+    def claim(self, worker, kinds=None):
+        """
+        Take the next ready job (highest priority, then oldest) and mark it running
+
+        Returns:
+            Job dict or None when the queue is empty
+        """
+        conn = self._connect()
+        now = time.time()
+        # BEGIN IMMEDIATE: khóa ghi ngay -> hai worker không nhận cùng một job
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Worker chết giữa chừng (không còn heartbeat) -> trả job về hàng đợi
+            conn.execute('''
+                UPDATE jobs SET status = 'queued', worker = NULL, message = 'Worker lost, requeued'
+                WHERE status = 'running' AND heartbeat < ?
+            ''', (now - self.lease,))
+            kinds = sorted(kinds) if kinds is not None else None
+            kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ''
+            row = conn.execute(f'''
+                SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? {kind_filter}
+                ORDER BY priority DESC, run_after, id LIMIT 1
+            ''', [now] + (kinds or [])).fetchone()
+            if row is not None:
+                conn.execute('''
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,
+                        started = ?, heartbeat = ?, error = NULL
+                    WHERE id = ?
+                ''', (worker, now, now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self.get(row['id']) if row is not None else None
+
+    def progress(self, job_id, progress, message=None):
+        """
+        Report progress (0..1) of a running job, also renews its lease
+
+        Raises:
+            JobCancelled if the job was cancelled meanwhile
+        """
+        cursor = self._connect().execute('''
+            UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat = ?
+            WHERE id = ? AND status = 'running'
+        ''', (max(0.0, min(1.0, progress)), message, time.time(), job_id))
+        if cursor.rowcount == 0:
+            raise JobCancelled(job_id)
+
+    def heartbeat(self, job_id):
+        """
+        Renew the lease of a running job
+
+        Returns:
+            False if the job is no longer running (cancelled, requeued)
+        """
+        cursor = self._connect().execute('''
+            UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'
+        ''', (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def finish(self, job_id, result=None):
+        self._connect().execute('''
+            UPDATE jobs SET status = 'done', progress = 1, result = ?, finished = ?, heartbeat = ?
+            WHERE id = ? AND status = 'running'
+        ''', (json.dumps(result, ensure_ascii=False), time.time(), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        """Requeue the job with exponential backoff, or mark it failed after max_attempts"""
+        job = self.get(job_id)
+        if job is None or job['status'] != 'running':
+            return
+        now = time.time()
+        if job['attempts'] < job['max_attempts']:
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+            self._connect().execute('''
+                UPDATE jobs SET status = 'queued', run_after = ?, error = ?, worker = NULL
+                WHERE id = ? AND status = 'running'
+            ''', (now + delay, error, job_id))
+            log.warning("🔁 Job retry", id=job_id, kind=job['kind'], attempt=job['attempts'], delay=delay, error=error)
+        else:
+            self._connect().execute('''
+                UPDATE jobs SET status = 'failed', error = ?, finished = ?
+                WHERE id = ? AND status = 'running'
+            ''', (error, now, job_id))
+            log.error("❌ Job failed", id=job_id, kind=job['kind'], attempts=job['attempts'], error=error)
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job (a running handler stops at its next progress report)
+
+        Returns:
+            True if the job was cancelled
+        """
+        cursor = self._connect().execute('''
+            UPDATE jobs SET status = 'cancelled', finished = ?
+            WHERE id = ? AND status IN ('queued', 'running')
+        ''', (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def purge(self, max_age, on_remove=None):
+        """
+        Delete finished jobs older than max_age seconds, and jobs still queued max_age seconds
+        after they were submitted (no worker running, vd. JOB_WORKERS=0 without `python jobs.py worker`)
+
+        Args:
+            on_remove: Called with each removed job (vd. xóa file kết quả)
+
+        Returns:
+            Number of jobs removed
+        """
+        conn = self._connect()
+        cutoff = time.time() - max_age
+        rows = conn.execute('''
+            SELECT * FROM jobs
+            WHERE (status IN ('done', 'failed', 'cancelled') AND finished < ?) OR (status = 'queued' AND created < ?)
+        ''', (cutoff, cutoff)).fetchall()
+        for row in rows:
+            if on_remove is not None:
+                on_remove(self._row(row))
+            conn.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
+        return len(rows)
+
+    def run(self, job):
+        """Run a claimed job with its registered handler and record the outcome"""
+        handler = _handlers.get(job['kind'])
+        if handler is None:
+            self.fail(job['id'], f"No handler for job kind {job['kind']}")
+            return
+        start = time.perf_counter()
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(job['id'], stop),
+                                     name=f"job-{job['id']}-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job['payload'], _JobContext(self, job))
+        except JobCancelled:
+            log.info("🛑 Job cancelled", id=job['id'], kind=job['kind'])
+            return
+        except Exception as e:
+            log.exception("❌ Job error", id=job['id'], kind=job['kind'])
+            self.fail(job['id'], f"{type(e).__name__}: {e}")
+            return
+        finally:
+            stop.set()
+            heartbeat.join()
+        self.finish(job['id'], result)
+        log.info("✅ Job done", id=job['id'], kind=job['kind'], duration=round(time.perf_counter() - start, 3))
+
+    def _heartbeat_loop(self, job_id, stop):
+        """Renew the lease while the handler runs (một file Drive tải lâu không làm job bị chạy lại)"""
+        while not stop.wait(self.lease / 3):
+            try:
+                if not self.heartbeat(job_id):
+                    return
+            except sqlite3.OperationalError as e:
+                log.warning("⚠️ Could not renew job lease", id=job_id, error=e)
+
+class _JobContext:
+    """Second argument of handlers"""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job['id']
+        self.attempt = job['attempts']
+
+    def progress(self, progress, message=None):
+        self.queue.progress(self.id, progress, message)
+
+def run_worker(queue, name=None, poll_interval=1.0, stop=None, parent=None):
+    """
+    Claim and run jobs until stop (threading.Event) is set
+
+    Args:
+        queue: JobQueue
+        name: Worker name stored on claimed jobs
+        poll_interval: Seconds to wait when the queue is empty
+        parent: Pid of the process that started the worker; the worker exits when it is gone
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    log.info("👷 Job worker started", worker=name, kinds=','.join(sorted(_handlers)))
+    while stop is None or not stop.is_set():
+        if parent is not None and os.getppid() != parent:
+            log.info("👷 Job worker stopped, parent process exited", worker=name)
+            return
+        try:
+            job = queue.claim(name, kinds=set(_handlers))
+        except sqlite3.OperationalError as e:
+            log.warning("⚠️ Could not claim job", error=e)
+            job = None
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        queue.run(job)
+
+class WorkerPool:
+    def __init__(self, module, count=2, lock_path='jobs.db.workers.lock', check_interval=5):
+        """
+        Initialize Worker Pool: `python jobs.py worker` subprocesses importing module
+        (which creates the JobQueue and registers the handlers), restarted when they exit
+
+        Args:
+            module: Module name of the handlers (vd. 'fromminhmoi')
+            count: Number of worker processes
+            lock_path: File lock making sure only one web process (of several gunicorn workers) runs the pool
+            check_interval: Seconds between checks of the lock / worker processes
+        """
+        self.module = module
+        self.count = count
+        self.lock_path = lock_path
+        self.check_interval = check_interval
+        self._lock_file = None
+        self._processes = []
+
+    def start(self):
+        """Supervise the pool from a daemon thread"""
+        if self.count <= 0:
+            return None
+        thread = threading.Thread(target=self._supervise, name='job-supervisor', daemon=True)
+        thread.start()
+        atexit.register(self.stop)
+        return thread
+
+    def _acquire(self):
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # giữ mở: lock tự nhả khi process này chết
+        return True
+
+    def _spawn(self):
+        env = dict(os.environ, JOB_WORKER='1')
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '1',
+                                 '--module', self.module, '--parent', str(os.getpid())], env=env)
+
+    def _supervise(self):
+        while True:
+            try:
+                if self._acquire():
+                    self._processes = [p for p in self._processes if p.poll() is None]
+                    while len(self._processes) < self.count:
+                        self._processes.append(self._spawn())
+                        log.info("👷 Job worker process started", pid=self._processes[-1].pid)
+            except Exception:
+                log.exception("⚠️ Job supervisor error")
+            time.sleep(self.check_interval)
+
+    def stop(self):
+        for process in self._processes:
+            process.terminate()
+
+def _main(argv):
+    if argv[:1] != ['worker']:
+        print(__doc__)
+        return
+    count = int(argv[1]) if len(argv) > 1 and argv[1].isdigit() else 1
+    module = argv[argv.index('--module') + 1] if '--module' in argv else 'fromminhmoi'
+    parent = int(argv[argv.index('--parent') + 1]) if '--parent' in argv else None
+    os.environ['JOB_WORKER'] = '1'
+    sys.path.insert(0, os.getcwd())
+    handlers = importlib.import_module(module)
+    queue = handlers.job_queue
+
+    if count == 1:
+        run_worker(queue, parent=parent)
+        return
+    # Nhiều worker trong một lệnh: mỗi worker một process con
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '1',
+                                   '--module', module, '--parent', str(os.getpid())])
+                 for _ in range(count)]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+if __name__ == '__main__':
+    # Chạy qua module 'jobs' (không phải __main__) để dùng chung registry với các handler
+    import jobs
+    jobs._main(sys.argv[1:])
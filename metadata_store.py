@@ -0,0 +1,163 @@
+"""
+Metadata Store for LMS Licker
+Keep uploader, upload time, size and mtime of local files in one SQLite database
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+from structured_log import get_logger
+
+log = get_logger('metadata')
+
+class MetadataStore:
+    def __init__(self, db_path='metadata.db'):
+        """
+        Initialize Metadata Store
+
+        Args:
+            db_path: Path to SQLite database file (WAL mode)
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    filename TEXT PRIMARY KEY,
+                    uploader TEXT,
+                    upload_time TEXT,
+                    size INTEGER,
+                    mtime REAL
+                )
+            ''')
+
+    def save(self, filename, uploader=None, upload_time=None, size=None, mtime=None):
+        """
+        Insert or update metadata of a file
+
+        Fields left as None keep their current value.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                INSERT INTO files (filename, uploader, upload_time, size, mtime)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    uploader = COALESCE(excluded.uploader, files.uploader),
+                    upload_time = COALESCE(excluded.upload_time, files.upload_time),
+                    size = COALESCE(excluded.size, files.size),
+                    mtime = COALESCE(excluded.mtime, files.mtime)
+            ''', (filename, uploader, upload_time, size, mtime))
+
+    def get(self, filename):
+        """
+        Get metadata of a file
+
+        Returns:
+            Dictionary with filename, uploader, upload_time, size, mtime or None
+        """
+        row = self._connect().execute(
+            'SELECT filename, uploader, upload_time, size, mtime FROM files WHERE filename = ?',
+            (filename,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, filename):
+        """Remove metadata of a file"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM files WHERE filename = ?', (filename,))
+
+    def list_files(self):
+        """
+        List metadata of all files
+
+        Returns:
+            List of dictionaries sorted by filename
+        """
+        rows = self._connect().execute(
+            'SELECT filename, uploader, upload_time, size, mtime FROM files ORDER BY filename'
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def sync_folder(self, folder):
+        """
+        Reconcile the store with files actually present in a folder
+        (files copied in by hand, files removed outside the app)
+
+        Returns:
+            Number of files in the folder
+        """
+        entries = {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime)
+
+        conn = self._connect()
+        known = {row['filename']: (row['size'], row['mtime'])
+                 for row in conn.execute('SELECT filename, size, mtime FROM files')}
+        # Chỉ ghi file mới / đã đổi
+        changed = [(name, size, mtime) for name, (size, mtime) in entries.items() if known.get(name) != (size, mtime)]
+        stale = [(name,) for name in known if name not in entries]
+        if changed or stale:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO files (filename, size, mtime) VALUES (?, ?, ?)
+                    ON CONFLICT(filename) DO UPDATE SET size = excluded.size, mtime = excluded.mtime
+                ''', changed)
+                conn.executemany('DELETE FROM files WHERE filename = ?', stale)
+        return len(entries)
+
+    def import_legacy_folder(self, folder):
+        """
+        Import old per-file JSON metadata (metadata/<filename>.json)
+
+        Returns:
+            Number of records imported
+        """
+        if not os.path.isdir(folder):
+            return 0
+
+        records = []
+        for name in os.listdir(folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+                records.append((
+                    metadata.get('filename', name[:-len('.json')]),
+                    metadata.get('uploader'),
+                    metadata.get('upload_time')
+                ))
+            except Exception as e:
+                log.warning("⚠️ Could not import metadata", file=name, error=e)
+
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT INTO files (filename, uploader, upload_time) VALUES (?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    uploader = COALESCE(files.uploader, excluded.uploader),
+                    upload_time = COALESCE(files.upload_time, excluded.upload_time)
+            ''', records)
+        return len(records)
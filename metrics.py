@@ -0,0 +1,258 @@
+"""
+Metrics for LMS Licker
+In-process counters and histograms (Flask routes, Google Drive calls, caches)
+rendered in the Prometheus text format for /metrics
+
+Mỗi worker (gunicorn) giữ số liệu riêng: Prometheus gộp theo instance / pod.
+"""
+
+import time
+import bisect
+import inspect
+import logging
+import threading
+import contextvars
+from functools import wraps
+
+# Giây - từ phản hồi từ cache tới tải file lớn qua Drive
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize Counter
+
+        Args:
+            name: Metric name (lms_..._total)
+            documentation: HELP text
+            labelnames: Label names, values are passed to inc() as keyword arguments
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {} if self.labelnames else {(): 0}  # label values -> float
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Initialize Histogram
+
+        Args:
+            name: Metric name (lms_..._seconds)
+            documentation: HELP text
+            labelnames: Label names, values are passed to observe() as keyword arguments
+            buckets: Upper bounds; percentiles come from histogram_quantile() on the Prometheus side
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(state[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns:
+            All metrics in the Prometheus text exposition format (version 0.0.4)
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'lms_http_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status'))
+http_latency = registry.histogram(
+    'lms_http_request_duration_seconds', 'Time to build the response (streamed bodies excluded)', ('endpoint', 'method'))
+http_response_bytes = registry.counter(
+    'lms_http_response_bytes_total', 'Response body bytes when the length is known', ('endpoint',))
+drive_calls = registry.counter(
+    'lms_drive_calls_total', 'GoogleDriveManager calls by method and outcome', ('method', 'outcome'))
+drive_latency = registry.histogram(
+    'lms_drive_call_duration_seconds', 'GoogleDriveManager call duration', ('method',))
+drive_bytes = registry.counter(
+    'lms_drive_bytes_total', 'Bytes transferred to / from Google Drive', ('method', 'direction'))
+drive_errors = registry.counter(
+    'lms_drive_errors_total', 'Google Drive API errors by method and HTTP status', ('method', 'status'))
+drive_retries = registry.counter(
+    'lms_drive_retries_total', 'Retries done by googleapiclient (num_retries > 0)', ())
+cache_requests = registry.counter(
+    'lms_cache_requests_total', 'Cache lookups by cache and result (hit / miss)', ('cache', 'result'))
+
+# Google Drive
+# ContextVar thay vì thread-local: dùng được cho cả thread (GoogleDriveManager) lẫn coroutine (AsyncGoogleDriveManager)
+_drive_calls = contextvars.ContextVar('drive_calls', default=())
+
+def _current_drive_call():
+    stack = _drive_calls.get()
+    return stack[-1] if stack else None
+
+def _begin_drive_call(method):
+    call = {'method': method.__name__, 'error': False, 'start': time.perf_counter()}
+    return call, _drive_calls.set(_drive_calls.get() + (call,))
+
+def _end_drive_call(call, token):
+    _drive_calls.reset(token)
+    drive_latency.observe(time.perf_counter() - call['start'], method=call['method'])
+    drive_calls.inc(method=call['method'], outcome='error' if call['error'] else 'ok')
+    parent = _current_drive_call()
+    if call['error'] and parent is not None:
+        # Lỗi của hàm con (vd. get_file_id_by_name) cũng là lỗi của hàm gọi nó
+        parent['error'] = True
+
+def drive_call(method):
+    """Decorator for (async) Drive manager methods: count, latency and outcome of each call"""
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            call, token = _begin_drive_call(method)
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                call['error'] = True
+                raise
+            finally:
+                _end_drive_call(call, token)
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        call, token = _begin_drive_call(method)
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            call['error'] = True
+            raise
+        finally:
+            _end_drive_call(call, token)
+    return wrapper
+
+def record_drive_error(error):
+    """Record an error caught inside a GoogleDriveManager method (HttpError or other)"""
+    call = _current_drive_call()
+    if call is not None:
+        call['error'] = True
+    resp = getattr(error, 'resp', None)  # HttpError (googleapiclient)
+    response = getattr(error, 'response', None)  # HTTPError (requests)
+    status = (getattr(resp, 'status', None) or getattr(response, 'status_code', None)
+              or getattr(error, 'status', None) or type(error).__name__)
+    drive_errors.inc(method=call['method'] if call else 'unknown', status=status)
+
+def record_drive_bytes(direction, size, method=None):
+    """Record bytes uploaded ('upload') or downloaded ('download') by the current Drive call"""
+    call = _current_drive_call()
+    method = method or (call['method'] if call else 'unknown')
+    drive_bytes.inc(size or 0, method=method, direction=direction)
+
+class _RetryLogHandler(logging.Handler):
+    """googleapiclient chỉ báo retry qua log 'Sleeping ... before retry ...'"""
+
+    def emit(self, record):
+        if 'before retry' in str(record.msg):
+            drive_retries.inc()
+
+_retry_logger = logging.getLogger('googleapiclient.http')
+_retry_logger.addHandler(_RetryLogHandler(logging.WARNING))
+
+# Caches
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+# Flask routes
+def instrument_app(app):
+    """Record count, latency and response size of every request handled by app"""
+    from flask import g, request
+
+    def endpoint():
+        return request.endpoint or 'unmatched'
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            http_latency.observe(time.perf_counter() - start, endpoint=endpoint(), method=request.method)
+            http_requests.inc(endpoint=endpoint(), method=request.method, status=response.status_code)
+            if response.content_length:
+                http_response_bytes.inc(response.content_length, endpoint=endpoint())
+        return response
+
+    @app.teardown_request
+    def _metrics_unhandled(exc):
+        # after_request không chạy khi có exception không bắt được -> 500
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            http_latency.observe(time.perf_counter() - start, endpoint=endpoint(), method=request.method)
+            http_requests.inc(endpoint=endpoint(), method=request.method, status=500)
@@ -0,0 +1,120 @@
+"""
+Parsed File Cache for LMS Licker
+Keep results derived from stored files (parsed questions, DOCX previews)
+as gzipped JSON keyed by file version
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from structured_log import get_logger
+
+log = get_logger('parsed_cache')
+
+class ParsedFileCache:
+    def __init__(self, folder='parsed_cache', memory_size=32):
+        """
+        Initialize Parsed File Cache
+
+        Args:
+            folder: Folder holding one <name hash>-<version hash>.json.gz file per stored file
+            memory_size: Number of parsed files also kept in memory (LRU)
+        """
+        self.folder = folder
+        self.memory_size = memory_size
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # (filename, version) -> result
+        self._files = {}  # digest(filename) -> cache files on disk, để put/remove không phải listdir cả folder
+        os.makedirs(folder, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index the cache files on disk once (also picks up versions written by other processes)"""
+        files = {}
+        for name in os.listdir(self.folder):
+            if name.endswith('.json.gz'):
+                files.setdefault(name.split('-', 1)[0], set()).add(os.path.join(self.folder, name))
+        with self._lock:
+            self._files = files
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()[:20]
+
+    def _path(self, filename, version):
+        # Tên file có cả version -> kiểm tra cache chỉ cần os.path.exists, không phải giải nén
+        return os.path.join(self.folder, f"{self._digest(filename)}-{self._digest(str(version))}.json.gz")
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def has(self, filename, version):
+        """Check whether a file version is cached"""
+        with self._lock:
+            if (filename, version) in self._memory:
+                return True
+        return os.path.exists(self._path(filename, version))
+
+    def get(self, filename, version):
+        """
+        Get the cached result of a file version
+
+        Returns:
+            The stored JSON value or None if not cached.
+            The result is shared between callers: copy it before modifying it.
+        """
+        key = (filename, version)
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                return result
+
+        try:
+            with gzip.open(self._path(filename, version), 'rt', encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("⚠️ Could not read cache entry", cache=self.folder, file=filename, error=e)
+            return None
+
+        with self._lock:
+            # Có thể do process khác ghi: nhớ để put / remove sau này xóa được
+            self._files.setdefault(self._digest(filename), set()).add(self._path(filename, version))
+        self._remember(key, result)
+        return result
+
+    def put(self, filename, version, result):
+        """Store the result of a file version (older versions are dropped)"""
+        path = self._path(filename, version)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(result, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+        self.remove(filename, keep=path)
+        self._remember((filename, version), result)
+
+    def remove(self, filename, keep=None):
+        """Drop every cached version of a file"""
+        digest = self._digest(filename)
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == filename and self._path(*key) != keep]:
+                del self._memory[key]
+            stale = self._files.pop(digest, set())
+            if keep is not None:
+                stale.discard(keep)
+                self._files[digest] = {keep}
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,247 @@
+"""
+Request Profiler for LMS Licker
+Opt-in cProfile of production requests: 1-in-N sampling or a signed X-Profile-Token header,
+profiles kept on disk with a summary of their hot functions
+
+Usage:
+    python profiler.py token [seconds]   # print an X-Profile-Token value (needs PROFILE_SECRET)
+"""
+
+import os
+import io
+import re
+import sys
+import hmac
+import json
+import time
+import pstats
+import random
+import cProfile
+import hashlib
+import itertools
+import threading
+
+from structured_log import get_logger
+
+log = get_logger('profiler')
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_ID_PATTERN = re.compile(r'[0-9]+-[0-9]+-[0-9]+')
+HOT_FUNCTIONS = 15
+
+def _function_label(key):
+    filename, line, name = key
+    if filename == '~':
+        return name  # built-in, vd. <method 'read' of '_io.BufferedReader' objects>
+    parts = filename.replace('\\', '/').split('/')
+    if 'site-packages' in parts:
+        parts = parts[parts.index('site-packages') + 1:]
+    elif len(parts) > 2:
+        parts = parts[-2:]
+    return f"{'/'.join(parts)}:{line}({name})"
+
+class RequestProfiler:
+    def __init__(self, folder='profiles', sample_rate=0, secret='', keep=200):
+        """
+        Initialize Request Profiler
+
+        Args:
+            folder: Folder holding <id>.prof (pstats) and <id>.json (summary) per profiled request
+            sample_rate: Profile about 1 request in sample_rate (0 = no sampling)
+            secret: Key of X-Profile-Token (empty = header ignored)
+            keep: Number of profiles kept, oldest removed first
+        """
+        self.folder = folder
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.keep = keep
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def sign(self, ttl=3600, now=None):
+        """
+        Returns:
+            X-Profile-Token value valid for ttl seconds
+        """
+        expires = int((now or time.time()) + ttl)
+        signature = hmac.new(self.secret.encode('utf-8'), f"profile:{expires}".encode('utf-8'), hashlib.sha256).hexdigest()
+        return f"{expires}.{signature}"
+
+    def verify(self, token, now=None):
+        if not self.secret or not token or '.' not in token:
+            return False
+        expires, _, _ = token.partition('.')
+        if not expires.isdigit() or int(expires) < (now or time.time()):
+            return False
+        return hmac.compare_digest(token, self.sign(0, now=int(expires)))
+
+    def trigger(self, token=None):
+        """
+        Decide whether to profile a request
+
+        Returns:
+            'header' (valid signed token), 'sample' (1-in-N) or None
+        """
+        if token and self.verify(token):
+            return 'header'
+        if self.sample_rate > 0 and random.random() * self.sample_rate < 1:
+            return 'sample'
+        return None
+
+    def start(self):
+        """Start profiling the current thread, None if another profiler is already active"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        return profile
+
+    def finish(self, profile, duration, info):
+        """
+        Stop a profile and store it
+
+        Args:
+            profile: Value returned by start()
+            duration: Request duration in seconds
+            info: Request details (method, path, endpoint, status, trigger)
+
+        Returns:
+            Profile id
+        """
+        profile.disable()
+        profile_id = f"{int(time.time() * 1000)}-{os.getpid()}-{next(self._counter)}"
+        stats = pstats.Stats(profile)
+
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:HOT_FUNCTIONS]
+        summary = dict(info, id=profile_id, time=time.time(), duration_ms=round(duration * 1000, 2), functions=[
+            {
+                'function': _function_label(key),
+                'calls': calls,
+                'self_ms': round(self_time * 1000, 2),
+                'total_ms': round(total_time * 1000, 2),
+            }
+            for key, (_, calls, self_time, total_time, _) in functions
+        ])
+
+        stats.dump_stats(os.path.join(self.folder, f"{profile_id}.prof"))
+        temp_path = os.path.join(self.folder, f"{profile_id}.json.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(self.folder, f"{profile_id}.json"))
+        self._prune()
+        return profile_id
+
+    def _ids(self):
+        ids = [name[:-5] for name in os.listdir(self.folder) if name.endswith('.json')]
+        # Id bắt đầu bằng thời điểm (ms) -> sắp theo số
+        return sorted(ids, key=lambda profile_id: [int(part) for part in profile_id.split('-')])
+
+    def _prune(self):
+        with self._lock:
+            ids = self._ids()
+            for profile_id in ids[:max(0, len(ids) - self.keep)]:
+                for extension in ('.json', '.prof'):
+                    try:
+                        os.remove(os.path.join(self.folder, profile_id + extension))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self, limit=20, sort='duration'):
+        """
+        Stored profile summaries
+
+        Args:
+            limit: Maximum number of summaries
+            sort: 'duration' (slowest first) or 'time' (newest first)
+        """
+        summaries = []
+        for profile_id in self._ids():
+            try:
+                with open(os.path.join(self.folder, f"{profile_id}.json"), 'r', encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # vừa bị xóa bởi worker khác
+        key = 'duration_ms' if sort == 'duration' else 'time'
+        summaries.sort(key=lambda summary: summary[key], reverse=True)
+        return summaries[:limit]
+
+    def path(self, profile_id):
+        """Path of the .prof file (snakeviz / pstats) or None"""
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        path = os.path.join(self.folder, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id, sort='cumulative', limit=60):
+        """
+        Returns:
+            pstats text report of a profile or None if not found
+        """
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def instrument_app(self, app, exclude=('static', 'metrics_endpoint')):
+        """Profile the requests of app chosen by trigger() (endpoints in exclude never)"""
+        from flask import g, request
+
+        def record(status):
+            state = g.pop('_profile', None)
+            if state is None:
+                return None
+            profile, trigger, start = state
+            return self.finish(profile, time.perf_counter() - start, {
+                'method': request.method,
+                'path': request.path,  # không lưu query string (code OAuth, ...)
+                'endpoint': request.endpoint,
+                'status': status,
+                'trigger': trigger,
+            })
+
+        @app.before_request
+        def _profile_start():
+            if request.endpoint in exclude:
+                return
+            trigger = self.trigger(request.headers.get(PROFILE_HEADER))
+            if trigger:
+                profile = self.start()
+                if profile is not None:
+                    g._profile = (profile, trigger, time.perf_counter())
+
+        @app.after_request
+        def _profile_finish(response):
+            trigger = g.get('_profile', (None, None, None))[1]
+            try:
+                profile_id = record(response.status_code)
+            except Exception:
+                log.exception("⚠️ Could not save request profile")
+                return response
+            if profile_id and trigger == 'header':
+                response.headers['X-Profile-Id'] = profile_id
+            return response
+
+        @app.teardown_request
+        def _profile_unhandled(exc):
+            # after_request không chạy khi có exception không bắt được
+            try:
+                record(500)
+            except Exception:
+                log.exception("⚠️ Could not save request profile")
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['token']:
+        from dotenv import load_dotenv
+        load_dotenv()
+        secret = os.environ.get('PROFILE_SECRET', '')
+        if not secret:
+            sys.exit('PROFILE_SECRET is not set')
+        ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 3600
+        print(f"{PROFILE_HEADER}: {RequestProfiler(secret=secret).sign(ttl)}")
+    else:
+        print(__doc__)
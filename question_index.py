@@ -0,0 +1,289 @@
+"""
+Question Index for LMS Licker
+Cross-file question deduplication: exact hashes of normalized question text
+plus MinHash/LSH signatures for near-duplicates
+"""
+
+import html
+import json
+import random
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+from search_index import TAG_RE, tokenize
+
+MERSENNE_PRIME = (1 << 61) - 1
+LOOKUP_BATCH = 500  # Id mỗi query "IN (...)" (SQLite cũ giới hạn 999 tham số)
+
+def _clean(raw_html):
+    return ' '.join(tokenize(html.unescape(TAG_RE.sub(' ', raw_html or ''))))
+
+def group_raw_questions(questions):
+    """
+    Group raw LMS questions: parent (group_id 0) followed by its children
+
+    Returns:
+        List of groups, each a list of raw question dictionaries
+    """
+    groups = {}
+    order = []
+    for question in questions:
+        group_id = question.get('group_id', 0)
+        key = group_id if group_id and group_id in groups else question['id']
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(question)
+    return [groups[key] for key in order]
+
+def normalize_group(group):
+    """
+    Normalized text of a question group (question, options, children)
+    so that the same question with slightly different HTML maps to the same text
+    """
+    parts = []
+    for question in group:
+        parts.append(_clean(question.get('question_direction')))
+        parts.extend(_clean(answer.get('value')) for answer in question.get('answer_option', []))
+    return ' | '.join(part for part in parts if part)
+
+class QuestionIndex:
+    def __init__(self, db_path='questions.db', num_perm=128, bands=32, threshold=0.75):
+        """
+        Initialize Question Index
+
+        Args:
+            db_path: Path to SQLite database file (WAL mode)
+            num_perm: Number of MinHash permutations
+            bands: Number of LSH bands (num_perm must be divisible by bands)
+            threshold: Minimum estimated Jaccard similarity for a near-duplicate
+        """
+        self.db_path = db_path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = random.Random(42)  # Cố định để chữ ký giống nhau giữa các lần chạy
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        with conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    filename TEXT PRIMARY KEY,
+                    version TEXT
+                );
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    question_id TEXT,  -- id trong file, JSON (1 và "1" khác nhau)
+                    text_hash TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_questions_hash ON questions (text_hash);
+                CREATE INDEX IF NOT EXISTS idx_questions_file ON questions (filename);
+                CREATE TABLE IF NOT EXISTS bands (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    question INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_bands ON bands (band, bucket);
+                CREATE INDEX IF NOT EXISTS idx_bands_question ON bands (question);
+            ''')
+
+    def signature(self, text):
+        """MinHash signature over word 3-gram shingles"""
+        words = text.split()
+        shingles = {' '.join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+                  for s in shingles]
+        return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+
+    def _buckets(self, signature):
+        """LSH bucket id of each band (signed 64-bit so it fits in SQLite INTEGER)"""
+        buckets = []
+        for band in range(self.bands):
+            chunk = array('Q', signature[band * self.rows:(band + 1) * self.rows]).tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, 'little', signed=True))
+        return buckets
+
+    @staticmethod
+    def _question_id(value):
+        """Id as it was in the file (rows indexed before ids were stored as JSON hold str(id))"""
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _similarity(self, sig_a, sig_b):
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / self.num_perm
+
+    def _prepare(self, group):
+        text = normalize_group(group)
+        if not text:
+            return None
+        signature = self.signature(text)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest(), signature
+
+    def index_file(self, filename, version, questions):
+        """
+        (Re-)index all questions of a stored file
+
+        Args:
+            filename: Name of the file
+            version: Version of the content (ETag) to detect changes later
+            questions: Raw LMS question list (as in the exported JSON)
+
+        Returns:
+            Number of question groups indexed
+        """
+        prepared = []
+        for group in group_raw_questions(questions):
+            result = self._prepare(group)
+            if result:
+                prepared.append((group, *result))
+
+        conn = self._connect()
+        with conn:
+            self._remove_locked(conn, filename)
+            for group, text_hash, signature in prepared:
+                cursor = conn.execute(
+                    'INSERT INTO questions (filename, question_id, text_hash, signature, data) VALUES (?, ?, ?, ?, ?)',
+                    (filename, json.dumps(group[0]['id'], ensure_ascii=False), text_hash, array('Q', signature).tobytes(),
+                     json.dumps(group, ensure_ascii=False))
+                )
+                conn.executemany(
+                    'INSERT INTO bands (band, bucket, question) VALUES (?, ?, ?)',
+                    [(band, bucket, cursor.lastrowid) for band, bucket in enumerate(self._buckets(signature))]
+                )
+            conn.execute('INSERT OR REPLACE INTO files (filename, version) VALUES (?, ?)', (filename, version))
+        return len(prepared)
+
+    def _remove_locked(self, conn, filename):
+        conn.execute('DELETE FROM bands WHERE question IN (SELECT id FROM questions WHERE filename = ?)', (filename,))
+        conn.execute('DELETE FROM questions WHERE filename = ?', (filename,))
+        conn.execute('DELETE FROM files WHERE filename = ?', (filename,))
+
+    def remove_file(self, filename):
+        """Remove all questions of a file"""
+        conn = self._connect()
+        with conn:
+            self._remove_locked(conn, filename)
+
+    def versions(self):
+        """
+        Returns:
+            Dictionary filename -> indexed version
+        """
+        rows = self._connect().execute('SELECT filename, version FROM files').fetchall()
+        return {row['filename']: row['version'] for row in rows}
+
+    def lookup(self, questions, allowed=None):
+        """
+        Check which questions are already in the library
+
+        Args:
+            questions: Raw LMS question list
+            allowed: Optional set of filenames the caller may see
+
+        Returns:
+            List of {'id', 'exact': [{'file', 'id'}], 'near': [{'file', 'id', 'similarity'}]} per question group
+        """
+        conn = self._connect()
+        results = []
+        for group in group_raw_questions(questions):
+            entry = {'id': group[0]['id'], 'exact': [], 'near': []}
+            results.append(entry)
+            prepared = self._prepare(group)
+            if not prepared:
+                continue
+            text_hash, signature = prepared
+
+            exact_ids = set()
+            for row in conn.execute('SELECT id, filename, question_id FROM questions WHERE text_hash = ?', (text_hash,)):
+                exact_ids.add(row['id'])
+                if allowed is None or row['filename'] in allowed:
+                    entry['exact'].append({'file': row['filename'], 'id': self._question_id(row['question_id'])})
+
+            candidates = set()
+            for band, bucket in enumerate(self._buckets(signature)):
+                for row in conn.execute('SELECT question FROM bands WHERE band = ? AND bucket = ?', (band, bucket)):
+                    if row['question'] not in exact_ids:
+                        candidates.add(row['question'])
+
+            # Một query cho mọi ứng viên (chia nhỏ theo giới hạn số tham số của SQLite)
+            candidates = sorted(candidates)
+            for start in range(0, len(candidates), LOOKUP_BATCH):
+                batch = candidates[start:start + LOOKUP_BATCH]
+                rows = conn.execute(
+                    f"SELECT filename, question_id, signature FROM questions WHERE id IN ({','.join('?' * len(batch))})",
+                    batch)
+                for row in rows:
+                    if allowed is not None and row['filename'] not in allowed:
+                        continue
+                    similarity = self._similarity(signature, array('Q', row['signature']))
+                    if similarity >= self.threshold:
+                        entry['near'].append({'file': row['filename'], 'id': self._question_id(row['question_id']),
+                                              'similarity': round(similarity, 3)})
+            entry['near'].sort(key=lambda m: -m['similarity'])
+        return results
+
+    def export(self, filenames):
+        """
+        Merge the questions of several files, dropping exact and near duplicates
+        (the first occurrence, in file order, is kept)
+
+        Args:
+            filenames: Files to merge
+
+        Returns:
+            (questions, stats) - raw LMS question list and {'groups', 'exact', 'near'} counts
+        """
+        conn = self._connect()
+        merged = []
+        seen_hashes = set()
+        kept = []      # signatures of kept groups
+        buckets = {}   # (band, bucket) -> indexes in kept
+        stats = {'groups': 0, 'exact': 0, 'near': 0}
+
+        for filename in filenames:
+            rows = conn.execute(
+                'SELECT text_hash, signature, data FROM questions WHERE filename = ? ORDER BY id', (filename,)
+            ).fetchall()
+            for row in rows:
+                if row['text_hash'] in seen_hashes:
+                    stats['exact'] += 1
+                    continue
+                signature = array('Q', row['signature'])
+                keys = list(enumerate(self._buckets(signature)))
+                candidates = {i for key in keys for i in buckets.get(key, ())}
+                if any(self._similarity(signature, kept[i]) >= self.threshold for i in candidates):
+                    stats['near'] += 1
+                    continue
+
+                seen_hashes.add(row['text_hash'])
+                for key in keys:
+                    buckets.setdefault(key, []).append(len(kept))
+                kept.append(signature)
+                merged.extend(json.loads(row['data']))
+                stats['groups'] += 1
+        return merged, stats
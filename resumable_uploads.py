@@ -0,0 +1,318 @@
+"""
+Resumable Uploads for LMS Licker
+Chunked admin uploads (create / append / complete, tus-style): each chunk is written to a
+small spool file and forwarded to a Google Drive resumable session, so a dropped connection
+only loses the chunk in flight and memory stays at one Drive chunk per upload
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import mimetypes
+from contextlib import contextmanager
+
+from structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong process
+    fcntl = None
+
+log = get_logger('uploads')
+
+# Drive yêu cầu mỗi chunk (trừ chunk cuối) là bội số của 256 KB
+DRIVE_CHUNK_ALIGNMENT = 256 * 1024
+COPY_BUFFER = 64 * 1024
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        """
+        Error returned to the client as {'error': message} with an HTTP status
+
+        Args:
+            message: Error message
+            status: HTTP status (404 unknown upload, 409 wrong offset, 413 too large, 502 Drive)
+            offset: Current offset of the upload, sent back so the client can resume
+        """
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+class ResumableUploadStore:
+    def __init__(self, folder='upload_sessions', data_folder='Data', drive_manager=None,
+                 chunk_size=8 * 1024 * 1024, max_size=500 * 1024 * 1024, max_age=24 * 3600):
+        """
+        Initialize Resumable Upload Store
+
+        Args:
+            folder: Folder holding <id>.json (state) and <id>.part (bytes not yet on Drive / local file)
+            data_folder: Destination of completed uploads when Google Drive is not used
+            drive_manager: GoogleDriveManager (None = local storage)
+            chunk_size: Bytes sent to Drive per request, rounded to a multiple of 256 KB
+            max_size: Largest accepted file
+            max_age: Seconds an unfinished upload is kept after its last chunk
+        """
+        self.folder = folder
+        self.data_folder = data_folder
+        self.drive_manager = drive_manager
+        self.chunk_size = max(DRIVE_CHUNK_ALIGNMENT, chunk_size // DRIVE_CHUNK_ALIGNMENT * DRIVE_CHUNK_ALIGNMENT)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._upload_locks = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, upload_id, extension):
+        # Id là uuid hex -> không thể trỏ ra ngoài folder
+        if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self.folder, upload_id + extension)
+
+    @contextmanager
+    def _locked(self, upload_id):
+        """Thread lock + file lock: một upload chỉ nhận một chunk tại một thời điểm, kể cả giữa các worker"""
+        if not os.path.exists(self._path(upload_id, '.json')):
+            raise UploadError('Upload not found', 404)
+        with self._lock:
+            lock = self._upload_locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path(upload_id, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, upload_id):
+        try:
+            with open(self._path(upload_id, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise UploadError('Upload not found', 404)
+
+    def _save(self, state):
+        """Atomic write: temp file in the same folder, then rename"""
+        state['updated'] = time.time()
+        fd, temp_path = tempfile.mkstemp(prefix=f".{state['id']}.", suffix='.tmp', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(temp_path, self._path(state['id'], '.json'))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _remove(self, upload_id):
+        for extension in ('.json', '.part', '.lock'):
+            try:
+                os.remove(self._path(upload_id, extension))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+
+    def create(self, filename, size, uploader=None):
+        """
+        Start an upload
+
+        Returns:
+            State dict (id, filename, size, offset, chunk_size, ...)
+        """
+        if size < 0:
+            raise UploadError('Invalid size')
+        if size > self.max_size:
+            raise UploadError('File too large', 413)
+
+        state = {
+            'id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'offset': 0,        # byte nhận từ client
+            'drive_offset': 0,  # byte Drive đã xác nhận
+            'drive_stale': False,
+            'session_uri': None,
+            'uploader': uploader,
+            'created': time.time(),
+        }
+        if self.drive_manager:
+            state['session_uri'] = self.drive_manager.create_upload_session(
+                filename, size, uploader, mimetypes.guess_type(filename)[0])
+            if not state['session_uri']:
+                raise UploadError('Could not start Drive upload', 502)
+        open(self._path(state['id'], '.part'), 'wb').close()
+        self._save(state)
+        log.info("📤 Upload started", id=state['id'], file=filename, bytes=size, uploader=uploader)
+        return self._public(state)
+
+    def get(self, upload_id):
+        """State of an upload (raises UploadError 404 if unknown)"""
+        return self._public(self._load(upload_id))
+
+    def _public(self, state):
+        return {
+            'id': state['id'],
+            'filename': state['filename'],
+            'size': state['size'],
+            'offset': state['offset'],
+            'chunk_size': self.chunk_size,
+            'file_id': state.get('file_id'),
+        }
+
+    def append(self, upload_id, offset, stream, length=None):
+        """
+        Append a chunk read from stream (request body) at offset
+
+        Args:
+            upload_id: Upload id
+            offset: Client's idea of the current offset (Upload-Offset header)
+            stream: Readable body, copied in small blocks
+            length: Content-Length of the chunk (None = read to the end)
+
+        Returns:
+            State dict with the new offset (bytes of an interrupted body are kept)
+        """
+        with self._locked(upload_id):
+            state = self._load(upload_id)
+            if offset != state['offset']:
+                raise UploadError('Offset mismatch', 409, state['offset'])
+            if length is not None and offset + length > state['size']:
+                raise UploadError('Chunk exceeds upload size', 413, state['offset'])
+
+            limit = state['size'] - offset if length is None else length
+            received = 0
+            try:
+                with open(self._path(upload_id, '.part'), 'ab') as part:
+                    while received < limit:
+                        block = stream.read(min(COPY_BUFFER, limit - received))
+                        if not block:
+                            break
+                        part.write(block)
+                        received += len(block)
+            finally:
+                # Kết nối đứt giữa chừng: giữ phần đã nhận, client tiếp tục từ offset mới
+                state['offset'] += received
+                self._save(state)
+
+            if self.drive_manager:
+                self._forward(state, final=False)
+            return self._public(state)
+
+    def _forward(self, state, final):
+        """Send full Drive chunks from the spool file (and the tail when final)"""
+        with open(self._path(state['id'], '.part'), 'r+b') as part:
+            sent = 0  # byte đầu spool file đã lên Drive
+            try:
+                if state['drive_stale']:
+                    # Chunk trước lỗi: Drive có thể đã nhận một phần -> hỏi lại offset
+                    status = self.drive_manager.upload_session_status(state['session_uri'], state['size'])
+                    if status is None:
+                        raise UploadError('Drive upload failed, retry later', 502, state['offset'])
+                    sent = status[0] - state['drive_offset']
+                    state['drive_offset'], state['drive_stale'] = status[0], False
+                    state['file_id'] = status[1]
+                    self._save(state)
+
+                while not state.get('file_id'):
+                    pending = os.fstat(part.fileno()).st_size - sent
+                    if pending < self.chunk_size and not (final and state['drive_offset'] + pending == state['size']):
+                        return
+                    part.seek(sent)
+                    data = part.read(self.chunk_size)
+                    if state['drive_offset'] + len(data) < state['size']:
+                        data = data[:len(data) // DRIVE_CHUNK_ALIGNMENT * DRIVE_CHUNK_ALIGNMENT]
+                    result = self.drive_manager.upload_session_chunk(
+                        state['session_uri'], data, state['drive_offset'], state['size'])
+                    if result is None:
+                        state['drive_stale'] = True
+                        self._save(state)
+                        raise UploadError('Drive upload failed, retry later', 502, state['offset'])
+                    committed, state['file_id'] = result
+                    sent += committed - state['drive_offset']
+                    state['drive_offset'] = committed
+                    self._save(state)
+            finally:
+                self._compact(part, sent)
+
+    def _compact(self, part, sent):
+        """Move the bytes not yet on Drive to the start of the spool file, block by block"""
+        if sent <= 0:
+            return
+        read_pos, write_pos = sent, 0
+        while True:
+            part.seek(read_pos)
+            block = part.read(COPY_BUFFER)
+            if not block:
+                break
+            part.seek(write_pos)
+            part.write(block)
+            read_pos += len(block)
+            write_pos += len(block)
+        part.truncate(write_pos)
+
+    def complete(self, upload_id):
+        """
+        Finish an upload once every byte was received
+
+        Returns:
+            State dict with file_id (Drive) and the local path when stored locally
+        """
+        with self._locked(upload_id):
+            state = self._load(upload_id)
+            if state['offset'] != state['size']:
+                raise UploadError('Upload incomplete', 409, state['offset'])
+
+            result = self._public(state)
+            if self.drive_manager:
+                self._forward(state, final=True)
+                result['file_id'] = state['file_id']
+            else:
+                destination = os.path.join(self.data_folder, state['filename'])
+                # os.replace cần cùng ổ đĩa; shutil.move tự copy nếu khác
+                shutil.move(self._path(upload_id, '.part'), destination)
+                result['path'] = destination
+            self._remove(upload_id)
+            log.info("✅ Upload completed", id=upload_id, file=state['filename'], bytes=state['size'],
+                     duration=round(time.time() - state['created'], 3))
+            return result
+
+    def cancel(self, upload_id):
+        """Abort an upload and its Drive session"""
+        with self._locked(upload_id):
+            state = self._load(upload_id)
+            if state['session_uri'] and not state.get('file_id'):
+                self.drive_manager.cancel_upload_session(state['session_uri'])
+            self._remove(upload_id)
+            log.info("🗑️ Upload cancelled", id=upload_id, file=state['filename'])
+
+    def purge(self, now=None):
+        """
+        Remove uploads without a chunk for max_age seconds
+
+        Returns:
+            Number of uploads removed
+        """
+        now = now or time.time()
+        removed = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-5]
+            try:
+                state = self._load(upload_id)
+            except UploadError:
+                continue
+            if now - state['updated'] > self.max_age:
+                try:
+                    self.cancel(upload_id)
+                    removed += 1
+                except UploadError:
+                    pass  # vừa hoàn tất ở worker khác
+        return removed
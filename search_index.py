@@ -0,0 +1,250 @@
+"""
+Search Index for LMS Licker
+Inverted index over file names and extracted text of .docx/.json/.txt files
+"""
+
+import os
+import re
+import io
+import gzip
+import json
+import html
+import bisect
+import zipfile
+import threading
+import unicodedata
+
+from structured_log import get_logger
+
+log = get_logger('search')
+
+TOKEN_RE = re.compile(r'\w+')
+TAG_RE = re.compile(r'<[^>]+>')
+DOCX_TEXT_RE = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>|</w:p>')
+INDEXABLE_EXTENSIONS = ('.docx', '.json', '.txt')
+
+def normalize_text(text):
+    """
+    Lowercase and strip Vietnamese diacritics ("Đáp án" -> "dap an")
+    """
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    return text.lower()
+
+def tokenize(text):
+    """Split normalized text into word tokens"""
+    return TOKEN_RE.findall(normalize_text(text))
+
+def _json_strings(data):
+    """Yield every string value of a JSON document"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+
+def extract_text(filename, content):
+    """
+    Extract plain text from a stored file
+
+    Args:
+        filename: Name of the file (extension decides the format)
+        content: File content as bytes
+
+    Returns:
+        Extracted text ('' for unsupported formats)
+    """
+    lower = filename.lower()
+    if lower.endswith('.docx'):
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            xml = zf.read('word/document.xml').decode('utf-8', errors='ignore')
+        parts = [m.group(1) if m.group(1) is not None else '\n' for m in DOCX_TEXT_RE.finditer(xml)]
+        return html.unescape(''.join(parts))
+
+    if lower.endswith('.json') or lower.endswith('.txt'):
+        text = content.decode('utf-8', errors='ignore')
+        try:
+            # LMS export: chỉ lấy các chuỗi (câu hỏi, đáp án), bỏ tag HTML
+            text = '\n'.join(_json_strings(json.loads(text)))
+        except ValueError:
+            pass
+        return html.unescape(TAG_RE.sub(' ', text))
+
+    return ''
+
+class SearchIndex:
+    def __init__(self, index_path='search_index.json.gz'):
+        """
+        Initialize Search Index
+
+        Args:
+            index_path: Gzipped JSON file used to persist the index between restarts
+        """
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._postings = {}      # token -> {filename: term count}
+        self._name_postings = {} # token -> set(filename)
+        self._docs = {}          # filename -> {'version': ..., 'tokens': [...], 'name_tokens': [...]}
+        self._vocab = []         # sorted tokens, rebuilt lazily for prefix search
+        self._vocab_dirty = False
+
+    def _remove_locked(self, filename):
+        doc = self._docs.pop(filename, None)
+        if not doc:
+            return
+        for token in doc['tokens']:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(filename, None)
+                if not postings:
+                    del self._postings[token]
+        for token in doc['name_tokens']:
+            names = self._name_postings.get(token)
+            if names is not None:
+                names.discard(filename)
+                if not names:
+                    del self._name_postings[token]
+        self._vocab_dirty = True
+
+    def _add_locked(self, filename, version, counts, name_tokens):
+        self._remove_locked(filename)
+        for token, count in counts.items():
+            self._postings.setdefault(token, {})[filename] = count
+        for token in name_tokens:
+            self._name_postings.setdefault(token, set()).add(filename)
+        self._docs[filename] = {
+            'version': version,
+            'tokens': list(counts),
+            'name_tokens': list(name_tokens)
+        }
+        self._vocab_dirty = True
+
+    def add(self, filename, content=None, version=None):
+        """
+        Index (or re-index) a file
+
+        Args:
+            filename: Name of the file
+            content: File content as bytes (None = index the name only)
+            version: Version of the content (ETag) to detect changes later
+        """
+        counts = {}
+        if content is not None and filename.lower().endswith(INDEXABLE_EXTENSIONS):
+            try:
+                for token in tokenize(extract_text(filename, content)):
+                    counts[token] = counts.get(token, 0) + 1
+            except Exception as e:
+                log.warning("⚠️ Could not extract text", file=filename, error=e)
+        name_tokens = set(tokenize(filename))
+
+        with self._lock:
+            self._add_locked(filename, version, counts, name_tokens)
+
+    def remove(self, filename):
+        """Remove a file from the index"""
+        with self._lock:
+            self._remove_locked(filename)
+
+    def versions(self):
+        """
+        Returns:
+            Dictionary filename -> indexed version
+        """
+        with self._lock:
+            return {filename: doc['version'] for filename, doc in self._docs.items()}
+
+    def _expand(self, token, prefix):
+        """Tokens matching a query token (exact, or every indexed token it prefixes)"""
+        if not prefix:
+            return [token]
+        if self._vocab_dirty:
+            self._vocab = sorted(set(self._postings) | set(self._name_postings))
+            self._vocab_dirty = False
+        start = bisect.bisect_left(self._vocab, token)
+        end = bisect.bisect_left(self._vocab, token + '\uffff')
+        return self._vocab[start:end]
+
+    def search(self, query, limit=50, allowed=None):
+        """
+        Search file names and contents (diacritic-insensitive, all terms must match,
+        the last term also matches as a prefix)
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            allowed: Optional set of filenames the caller may see
+
+        Returns:
+            List of {'name', 'score'} sorted by score
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for i, term in enumerate(terms):
+                term_scores = {}
+                for token in self._expand(term, prefix=(i == len(terms) - 1)):
+                    for filename, count in self._postings.get(token, {}).items():
+                        term_scores[filename] = term_scores.get(filename, 0) + count
+                    for filename in self._name_postings.get(token, ()):
+                        # Khớp tên file quan trọng hơn khớp nội dung
+                        term_scores[filename] = term_scores.get(filename, 0) + 100
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {f: scores[f] + s for f, s in term_scores.items() if f in scores}
+                if not scores:
+                    return []
+
+        results = [
+            {'name': filename, 'score': score}
+            for filename, score in scores.items()
+            if allowed is None or filename in allowed
+        ]
+        results.sort(key=lambda r: (-r['score'], r['name']))
+        return results[:limit]
+
+    def save(self):
+        """Persist the index (temp file + rename)"""
+        with self._lock:
+            data = {
+                'docs': self._docs,
+                'postings': self._postings
+            }
+            temp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+    def load(self):
+        """
+        Load a persisted index if present
+
+        Returns:
+            Number of documents loaded
+        """
+        if not os.path.exists(self.index_path):
+            return 0
+        try:
+            with gzip.open(self.index_path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            log.warning("⚠️ Could not load search index", path=self.index_path, error=e)
+            return 0
+
+        with self._lock:
+            self._docs = data.get('docs', {})
+            self._postings = data.get('postings', {})
+            self._name_postings = {}
+            for filename, doc in self._docs.items():
+                for token in doc['name_tokens']:
+                    self._name_postings.setdefault(token, set()).add(filename)
+            self._vocab_dirty = True
+            return len(self._docs)
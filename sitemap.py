@@ -0,0 +1,104 @@
+"""
+Sitemap Builder for LMS Licker
+Build sitemap.xml (a sitemap index past 50,000 URLs) from the public pages and library files
+"""
+
+import hashlib
+import threading
+from xml.sax.saxutils import escape
+
+MAX_URLS_PER_SITEMAP = 50000
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+class SitemapBuilder:
+    def __init__(self, base_url, max_urls=MAX_URLS_PER_SITEMAP):
+        """
+        Initialize Sitemap Builder
+
+        Args:
+            base_url: Absolute site URL without trailing slash
+            max_urls: Maximum number of URLs per sitemap file (protocol limit: 50,000)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.max_urls = max_urls
+        self._lock = threading.Lock()
+        self._version = None
+        self._documents = {}  # 'sitemap.xml' / 'sitemap-<n>.xml' -> (etag, bytes)
+        self._fragments = {}  # (path, lastmod, changefreq, priority) -> <url> element, dùng lại giữa các lần build
+
+    def is_current(self, version):
+        return version is not None and version == self._version
+
+    def _url(self, key):
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            path, lastmod, changefreq, priority = key
+            parts = [f'<url><loc>{escape(self.base_url + path)}</loc>']
+            if lastmod:
+                parts.append(f'<lastmod>{lastmod}</lastmod>')
+            if changefreq:
+                parts.append(f'<changefreq>{changefreq}</changefreq>')
+            if priority:
+                parts.append(f'<priority>{priority}</priority>')
+            parts.append('</url>')
+            fragment = ''.join(parts)
+        return fragment
+
+    @staticmethod
+    def _document(body):
+        data = (XML_HEADER + body).encode('utf-8')
+        return hashlib.sha1(data).hexdigest(), data
+
+    def update(self, version, urls):
+        """
+        Rebuild the sitemap documents for a new library version
+
+        Args:
+            version: Opaque version of the inputs (listing + hidden files)
+            urls: List of (path, lastmod, changefreq, priority); path is URL-encoded, relative to base_url
+        """
+        with self._lock:
+            if self.is_current(version):
+                return
+            # Chỉ render lại <url> của file mới / đổi; file không còn thì bỏ khỏi cache
+            fragments = {}
+            for key in urls:
+                fragments[key] = self._url(key)
+            self._fragments = fragments
+
+            keys = list(urls)
+            chunks = [keys[i:i + self.max_urls] for i in range(0, len(keys), self.max_urls)] or [[]]
+            documents = {}
+            urlsets = []
+            for chunk in chunks:
+                urlsets.append(self._document(
+                    f'<urlset xmlns="{SITEMAP_NS}">\n' + '\n'.join(fragments[key] for key in chunk) + '\n</urlset>'
+                ))
+
+            if len(chunks) == 1:
+                documents['sitemap.xml'] = urlsets[0]
+            else:
+                entries = []
+                for number, (chunk, document) in enumerate(zip(chunks, urlsets), start=1):
+                    name = f'sitemap-{number}.xml'
+                    documents[name] = document
+                    lastmod = max((key[1] for key in chunk if key[1]), default=None)
+                    entries.append(
+                        f'<sitemap><loc>{escape(f"{self.base_url}/{name}")}</loc>'
+                        + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '')
+                        + '</sitemap>'
+                    )
+                documents['sitemap.xml'] = self._document(
+                    f'<sitemapindex xmlns="{SITEMAP_NS}">\n' + '\n'.join(entries) + '\n</sitemapindex>'
+                )
+
+            self._documents = documents
+            self._version = version
+
+    def get(self, name):
+        """
+        Returns:
+            (etag, bytes) of a sitemap document or None
+        """
+        return self._documents.get(name)
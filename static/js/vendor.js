@@ -0,0 +1,44 @@
+// Tải thư viện JS khi cần (xuất/preview .docx), mỗi thư viện chỉ tải một lần.
+// window.VENDOR_SCRIPTS = { name: [URL đã pin, nguồn dự phòng...] }
+(function () {
+    const loads = {};
+
+    function inject(src) {
+        return new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = src;
+            script.onload = () => resolve();
+            script.onerror = () => {
+                script.remove();
+                reject(new Error('Không tải được ' + src));
+            };
+            document.head.appendChild(script);
+        });
+    }
+
+    async function loadSources(sources) {
+        let lastError = null;
+        for (const src of sources) {
+            try {
+                await inject(src);
+                return;
+            } catch (err) {
+                console.warn(err.message);
+                lastError = err;
+            }
+        }
+        throw lastError || new Error('Không có nguồn để tải thư viện');
+    }
+
+    window.loadVendor = function (name) {
+        if (!loads[name]) {
+            const sources = (window.VENDOR_SCRIPTS || {})[name] || [];
+            // Lỗi thì cho phép thử lại ở lần bấm sau
+            loads[name] = loadSources(sources).catch(err => {
+                delete loads[name];
+                throw err;
+            });
+        }
+        return loads[name];
+    };
+})();
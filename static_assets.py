@@ -0,0 +1,238 @@
+"""
+Static Assets for LMS Licker
+Build step: fingerprint, precompress (gzip/brotli) and re-encode (WebP/AVIF) the files
+of static/ into a manifest, then pick the right file per request
+"""
+
+import os
+import io
+import json
+import gzip
+import hashlib
+import mimetypes
+import threading
+
+from structured_log import configure_logging, get_logger
+
+try:
+    import brotli
+except ImportError:  # Không có brotli: chỉ tạo bản .gz
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Không có Pillow: không tạo bản WebP/AVIF
+    Image = None
+
+log = get_logger('static')
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.txt', '.svg', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot', '.map')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# (mimetype, extension, Pillow save options) - thứ tự ưu tiên khi trình duyệt nhận nhiều định dạng
+IMAGE_VARIANTS = (
+    ('image/avif', '.avif', {'quality': 55, 'speed': 8}),
+    ('image/webp', '.webp', {'quality': 80, 'method': 4}),
+)
+ENCODINGS = ('br', 'gzip')
+MIN_COMPRESS_SIZE = 256
+
+mimetypes.add_type('font/ttf', '.ttf')
+mimetypes.add_type('image/avif', '.avif')
+mimetypes.add_type('image/webp', '.webp')
+
+def _write_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _smaller(candidate, original, ratio=0.9):
+    """Only keep a re-encoded copy that saves at least 10%"""
+    return candidate is not None and len(candidate) < len(original) * ratio
+
+class StaticAssets:
+    def __init__(self, source_folder='static', build_folder='static_build'):
+        """
+        Initialize Static Assets
+
+        Args:
+            source_folder: Folder with the original assets
+            build_folder: Output folder for fingerprinted / precompressed files and manifest.json
+        """
+        self.source_folder = source_folder
+        self.build_folder = build_folder
+        self.manifest_path = os.path.join(build_folder, 'manifest.json')
+        self._manifest = {}   # source name -> record
+        self._by_file = {}    # fingerprinted name -> record (kể cả bản WebP/AVIF)
+        self.version = None   # đổi mỗi khi manifest đổi (URL trong HTML đã render cũng đổi)
+
+    def _source_files(self):
+        for root, _, names in os.walk(self.source_folder):
+            for name in names:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.source_folder).replace(os.sep, '/'), path
+
+    def is_stale(self):
+        """Manifest missing or older than one of the source files"""
+        try:
+            built = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return True
+        return any(os.stat(path).st_mtime > built for _, path in self._source_files())
+
+    def _encode_image(self, data, source_path, extension, options):
+        try:
+            with Image.open(source_path) as image:
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+                out = io.BytesIO()
+                image.save(out, format=extension[1:].upper(), **options)
+                return out.getvalue()
+        except Exception as e:
+            log.warning("⚠️ Could not encode image", file=source_path, format=extension[1:], error=e)
+            return None
+
+    def _emit(self, relname, data, written):
+        """Write a fingerprinted file plus its precompressed copies, return its record"""
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        base, extension = os.path.splitext(relname)
+        fingerprinted = f"{base}.{digest}{extension}"
+        out_path = os.path.join(self.build_folder, fingerprinted)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        if not os.path.exists(out_path):
+            _write_atomic(out_path, data)
+        written.add(fingerprinted)
+
+        record = {'file': fingerprinted, 'size': len(data), 'encodings': {}}
+        if extension.lower() in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            candidates = {'gzip': ('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))}
+            if brotli is not None:
+                candidates['br'] = ('.br', lambda: brotli.compress(data, quality=11))
+            for encoding, (suffix, compress) in candidates.items():
+                compressed_name = fingerprinted + suffix
+                compressed_path = os.path.join(self.build_folder, compressed_name)
+                if not os.path.exists(compressed_path):
+                    compressed = compress()
+                    if not _smaller(compressed, data):
+                        continue
+                    _write_atomic(compressed_path, compressed)
+                record['encodings'][encoding] = compressed_name
+                written.add(compressed_name)
+        return record
+
+    def build(self):
+        """
+        Build the fingerprinted assets and manifest.json
+
+        Returns:
+            Number of source files in the manifest
+        """
+        os.makedirs(self.build_folder, exist_ok=True)
+        manifest = {}
+        written = {'manifest.json'}
+
+        for relname, path in sorted(self._source_files()):
+            with open(path, 'rb') as f:
+                data = f.read()
+            record = self._emit(relname, data, written)
+            record['variants'] = {}
+
+            base, extension = os.path.splitext(relname)
+            if Image is not None and extension.lower() in IMAGE_EXTENSIONS:
+                for mimetype, variant_extension, options in IMAGE_VARIANTS:
+                    encoded = self._encode_image(data, path, variant_extension, options)
+                    if _smaller(encoded, data):
+                        record['variants'][mimetype] = self._emit(base + variant_extension, encoded, written)
+            manifest[relname] = record
+
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+        # Xóa bản build cũ (fingerprint đã đổi)
+        for root, _, names in os.walk(self.build_folder):
+            for name in names:
+                relname = os.path.relpath(os.path.join(root, name), self.build_folder).replace(os.sep, '/')
+                if relname not in written and not name.endswith('.tmp'):
+                    os.remove(os.path.join(root, name))
+
+        log.info("📦 Static assets built", files=len(manifest), folder=self.build_folder)
+        self._set_manifest(manifest)
+        return len(manifest)
+
+    def _set_manifest(self, manifest):
+        by_file = {}
+        for record in manifest.values():
+            by_file[record['file']] = record
+            for variant in record.get('variants', {}).values():
+                by_file[variant['file']] = variant
+        self._manifest = manifest
+        self._by_file = by_file
+        self.version = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def load(self):
+        """
+        Load manifest.json if present
+
+        Returns:
+            Number of source files in the manifest
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            log.warning("⚠️ Could not load static manifest", error=e)
+            manifest = {}
+        self._set_manifest(manifest)
+        return len(manifest)
+
+    def url_path(self, filename):
+        """Fingerprinted name of a source asset (unchanged if it was not built)"""
+        record = self._manifest.get(filename)
+        return record['file'] if record else filename
+
+    def select(self, filename, accept_types=(), accept_encodings=()):
+        """
+        Pick the file to send for a request
+
+        Args:
+            filename: Requested path below /static/ (fingerprinted or source name)
+            accept_types: Mimetypes the client listed explicitly in Accept
+            accept_encodings: Encodings the client listed in Accept-Encoding
+
+        Returns:
+            {'path', 'mimetype', 'encoding', 'immutable', 'vary'} or None if not in the manifest
+        """
+        record = self._by_file.get(filename)
+        immutable = record is not None
+        if record is None:
+            record = self._manifest.get(filename)
+            if record is None:
+                return None
+
+        vary = []
+        variants = record.get('variants') or {}
+        if variants:
+            vary.append('Accept')
+            for mimetype, _, _ in IMAGE_VARIANTS:
+                if mimetype in variants and mimetype in accept_types:
+                    record = variants[mimetype]
+                    break
+
+        encoding = None
+        if record['encodings']:
+            vary.append('Accept-Encoding')
+            encoding = next((e for e in ENCODINGS if e in record['encodings'] and e in accept_encodings), None)
+
+        served = record['encodings'][encoding] if encoding else record['file']
+        return {
+            'path': os.path.join(self.build_folder, served),
+            'mimetype': mimetypes.guess_type(record['file'])[0] or 'application/octet-stream',
+            'encoding': encoding,
+            'immutable': immutable,
+            'vary': vary
+        }
+
+if __name__ == '__main__':
+    configure_logging()
+    StaticAssets().build()
@@ -0,0 +1,212 @@
+"""
+Structured Logging for LMS Licker
+Non-blocking logging: records go through a bounded queue to a background writer thread,
+with levels, key=value / JSON fields and rate-limited errors
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+
+ROOT_LOGGER = 'lms'
+RESERVED_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+_context_provider = None
+_listener = None
+
+def get_logger(name):
+    """
+    Logger of a module, fields are passed as keyword arguments:
+
+        log = get_logger('drive')
+        log.info("✅ Uploaded", file=filename, bytes=size, duration=0.42)
+    """
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+def set_context_provider(provider):
+    """provider() -> dict of fields added to every record (vd. route của request hiện tại)"""
+    global _context_provider
+    _context_provider = provider
+
+class StructuredLogger(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in RESERVED_KWARGS}
+        if _context_provider is not None:
+            try:
+                fields = dict(_context_provider(), **fields)
+            except Exception:
+                pass
+        extra = dict(kwargs.get('extra') or {})
+        extra['fields'] = fields
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst=10, interval=60, level=logging.ERROR):
+        """
+        Initialize Rate Limit Filter
+
+        Args:
+            burst: Records of the same message allowed per interval
+            interval: Window in seconds
+            level: Only records at this level or above are limited
+        """
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.level = level
+        self._lock = threading.Lock()
+        self._windows = {}  # (logger, message template) -> [window start, count, suppressed]
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 1000:
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.interval}
+                if suppressed:
+                    record.fields = dict(getattr(record, 'fields', {}), suppressed=suppressed)
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không bao giờ chờ: hàng đợi đầy thì bỏ record và đếm"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Chỉ ghép message ở thread gọi; format (kể cả traceback) làm ở thread ghi log
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _value(value):
+    text = str(value)
+    if not text or any(c in text for c in ' ="\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+class TextFormatter(logging.Formatter):
+    """2026-01-01T00:00:00.000Z INFO drive ✅ Uploaded file=a.json bytes=1234"""
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        name = record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + '.') else record.name
+        line = f"{timestamp} {record.levelname} {name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={_value(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (log aggregators)"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def configure_logging(level='INFO', fmt='text', stream=None, queue_size=10000, error_burst=10, error_interval=60):
+    """
+    Send every lms.* logger through a background writer thread (call once at startup)
+
+    Args:
+        level: Minimum level (DEBUG, INFO, WARNING, ERROR)
+        fmt: 'text' (key=value) or 'json'
+        stream: Output stream (default: stdout)
+        queue_size: Records waiting to be written; more are dropped instead of blocking
+        error_burst: Identical ERROR records allowed per error_interval seconds
+
+    Returns:
+        The queue handler (its .dropped counts lost records)
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(error_burst, error_interval))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    return handler
+
+def flush_logging():
+    """Write queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(flush_logging)
+
+def instrument_app(app, slow_threshold=1.0):
+    """
+    Log each request of app at DEBUG, and slow ones (>= slow_threshold seconds) at WARNING,
+    with route, status, duration and bytes
+    """
+    from flask import g, request, has_request_context
+
+    log = get_logger('http')
+    set_context_provider(lambda: {'route': request.endpoint} if has_request_context() else {})
+
+    @app.before_request
+    def _log_start():
+        g._log_start = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        start = g.pop('_log_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        level = logging.WARNING if duration >= slow_threshold else logging.DEBUG
+        if log.isEnabledFor(level):
+            log.log(level, "🐢 Slow request" if level == logging.WARNING else "Request",
+                    method=request.method, path=request.path, status=response.status_code,
+                    duration=round(duration, 4), bytes=response.content_length or 0)
+        return response
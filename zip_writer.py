@@ -0,0 +1,144 @@
+"""
+Zip Writer for LMS Licker
+Zip archives with per-entry compression: already-compressed formats (.docx, .pdf, images, ...)
+are stored as is, text is deflated, and large text members are deflated in parallel blocks
+"""
+
+import os
+import sys
+import time
+import zlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Định dạng đã nén sẵn (zip/deflate, JPEG, ...): deflate lại chỉ tốn CPU
+STORED_EXTENSIONS = (
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.pdf',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.br', '.zst',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.heic',
+    '.mp3', '.mp4', '.m4a', '.ogg', '.webm', '.woff', '.woff2',
+)
+# Magic bytes: file đã nén nhưng tên không có đuôi quen thuộc
+COMPRESSED_SIGNATURES = (
+    b'PK\x03\x04',         # zip (docx, xlsx, ...)
+    b'\x1f\x8b',           # gzip
+    b'\x89PNG',            # png
+    b'\xff\xd8\xff',       # jpeg
+    b'GIF8',               # gif
+    b'7z\xbc\xaf\x27\x1c', # 7z
+    b'Rar!',               # rar
+)
+WINDOW = 32 * 1024  # Cửa sổ của deflate: mỗi block dùng 32 KB trước nó làm dictionary
+
+# _write_deflated ghi entry đã nén sẵn qua phần nội bộ của zipfile (như ZipFile.mkdir / _open_to_write),
+# không phải API công khai: chỉ dùng trên các bản CPython đã kiểm tra (3.8 - 3.13) và khi đủ thuộc tính,
+# còn lại nén bằng zf.writestr như file nhỏ
+ZIPFILE_INTERNALS = ('_lock', '_seekable', '_writecheck', '_didModify', 'start_dir', 'fp', 'filelist', 'NameToInfo')
+ZIPFILE_VERIFIED = (3, 8) <= sys.version_info[:2] <= (3, 13)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor(workers):
+    # zlib nhả GIL khi nén -> thread là đủ để chạy song song trên nhiều core
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip')
+        return _executor
+
+def is_compressed(filename, head=b''):
+    """Whether a file is already compressed (by extension, or magic bytes of its first bytes)"""
+    return filename.lower().endswith(STORED_EXTENSIONS) or head.startswith(COMPRESSED_SIGNATURES)
+
+def _deflate_block(data, start, end, level, last):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=data[max(0, start - WINDOW):start])
+    # Z_SYNC_FLUSH kết thúc block ở biên byte -> các block nối lại thành một stream deflate hợp lệ
+    return compressor.compress(data[start:end]) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+class ZipWriter:
+    def __init__(self, fileobj, level=6, workers=None, block_size=1024 * 1024, parallel_min=2 * 1024 * 1024,
+                 parallel_max=256 * 1024 * 1024):
+        """
+        Initialize Zip Writer
+
+        Args:
+            fileobj: Destination (BytesIO, file on disk or a non-seekable stream)
+            level: Deflate level 1-9 for text members
+            workers: Threads compressing blocks of large members (default: CPU count)
+            block_size: Bytes per parallel deflate block
+            parallel_min: Members at least this large are deflated in parallel blocks
+            parallel_max: Larger local files are deflated by zipfile while streaming from disk
+        """
+        self.zf = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED, compresslevel=level)
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.parallel_min = parallel_min
+        self.parallel_max = parallel_max
+        self.precompressed = ZIPFILE_VERIFIED and all(hasattr(self.zf, name) for name in ZIPFILE_INTERNALS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    def add(self, name, data):
+        """Add a member from bytes"""
+        if is_compressed(name, data[:8]):
+            self.zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+        elif len(data) >= self.parallel_min and self.workers > 1 and self.precompressed:
+            self._write_deflated(name, data)
+        else:
+            self.zf.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=self.level)
+
+    def add_file(self, name, path):
+        """Add a member from a file on disk"""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(8)
+        if is_compressed(name, head):
+            self.zf.write(path, name, compress_type=zipfile.ZIP_STORED)
+        elif self.parallel_min <= size <= self.parallel_max and self.workers > 1 and self.precompressed:
+            with open(path, 'rb') as f:
+                self._write_deflated(name, f.read())
+        else:
+            self.zf.write(path, name, compress_type=zipfile.ZIP_DEFLATED, compresslevel=self.level)
+
+    def _write_deflated(self, name, data):
+        """Deflate blocks of data in parallel (pigz-style) and write the member already compressed"""
+        view = memoryview(data)  # block là view, không copy
+        starts = range(0, len(data), self.block_size)
+        executor = _get_executor(self.workers)
+        futures = [executor.submit(_deflate_block, view, start, start + self.block_size, self.level,
+                                   start + self.block_size >= len(data))
+                   for start in starts]
+        crc = zlib.crc32(data)
+        compressed = b''.join(future.result() for future in futures)
+
+        zinfo = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = len(data)
+        zinfo.compress_size = len(compressed)
+        zinfo.CRC = crc
+        zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+
+        # Giống ZipFile.mkdir: ghi header + dữ liệu đã nén, central directory do close() ghi
+        zf = self.zf
+        with zf._lock:
+            if zf._seekable:
+                zf.fp.seek(zf.start_dir)
+            zinfo.header_offset = zf.fp.tell()
+            zf._writecheck(zinfo)
+            zf._didModify = True
+            zf.fp.write(zinfo.FileHeader(zip64))
+            zf.fp.write(compressed)
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+            zf.start_dir = zf.fp.tell()